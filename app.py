@@ -1,13 +1,42 @@
 import os
 os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
 
+import sys
+import importlib
+import yaml
 import streamlit as st
 # Set konfigurasi halaman streamlit dengan layout wide
 st.set_page_config(layout="wide")
 
 import app.sidebar as sidebar
-import app.extractive_qa as extractive_qa
-import app.generative_qa as generative_qa
+from utils.lazy import timed, warmup
+
+with open('cfg/config.yaml', 'r', encoding='utf-8') as file:
+    config = yaml.safe_load(file)
+
+# Muat model halaman chat di thread latar saat proses dimulai (tanpa menahan render pertama)
+WARMUP_ON_START = config["Config"].get("WARMUP_ON_START", True)
+
+# Modul halaman baru di-import (beserta model-modelnya) saat halaman tersebut dibuka
+PAGES = {
+    "Extractive Q&A": "app.extractive_qa",
+    "Mulai Chat": "app.generative_qa",
+}
+
+def load_page(module_name):
+    if module_name in sys.modules:
+        return importlib.import_module(module_name)
+    with timed(f"import {module_name}"):
+        return importlib.import_module(module_name)
+
+@st.cache_resource
+def start_warmup():
+    """Sekali per proses: memuat encoder, index, dan reader halaman chat di thread latar."""
+    # Modul di-import di thread utama; thread latar hanya memuat model (tanpa fungsi Streamlit)
+    return warmup(load_page("app.generative_qa").warmup, name="warmup")
+
+if WARMUP_ON_START:
+    start_warmup()
 
 # Tampilkan sidebar dan ambil pilihan halaman
 page = sidebar.show()
@@ -54,7 +83,5 @@ a:hover, a:active {
 st.markdown(footer, unsafe_allow_html=True)
 
 # Panggil halaman sesuai pilihan pada sidebar
-if page == "Extractive Q&A":
-    extractive_qa.render()
-elif page == "Mulai Chat":
-    generative_qa.render()
+if page in PAGES:
+    load_page(PAGES[page]).render()
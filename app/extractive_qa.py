@@ -1,7 +1,11 @@
 import streamlit as st
-from transformers import pipeline
 import yaml
 
+from utils.reader import read_contexts, load_reader, READER_BACKEND
+from utils.qa_client import QA_SERVICE_URL, remote_extract
+from utils.lazy import timed
+from utils.telemetry import stage_timer, track_request
+
 # Muat konfigurasi dari file YAML
 @st.cache_resource
 def load_config():
@@ -10,24 +14,28 @@ def load_config():
 
 config = load_config()
 
-PIPELINE_NAME = config["Config"]["PIPELINE_NAME"]
 FINETUNED_MODEL_NAME = config["Config"]["FINETUNED_MODEL_NAME"]
 
-# Inisialisasi pipeline Q&A dengan caching sebagai resource (agar tidak di-hash)
+# Inisialisasi reader Q&A (backend sesuai READER_BACKEND) dengan caching sebagai resource (agar tidak di-hash).
+# Reader baru dimuat saat pertanyaan pertama, bukan saat halaman di-import
 @st.cache_resource
-def load_qa_pipeline():
-    return pipeline(PIPELINE_NAME, model=FINETUNED_MODEL_NAME)
-
-qa_pipeline = load_qa_pipeline()
+def load_qa_reader():
+    with timed("extractive_qa.reader"):
+        return load_reader(READER_BACKEND)
 
 # Fungsi untuk mengekstrak jawaban, hanya melakukan transformasi data sehingga bisa di-cache dengan st.cache_data
 @st.cache_data
 def extract_answer(question, context):
-    result = qa_pipeline(question=question, context=context)
-    # Jika pipeline mengembalikan list, ambil elemen pertama
-    if isinstance(result, list) and len(result) > 0:
-        result = result[0]
-    return result
+    # Hasil berbentuk dict {"answer", "score", "start", "end"} seperti pipeline question-answering
+    # Jika QA_SERVICE_URL diisi, reader dijalankan oleh qa_service.py
+    # Hanya cache miss st.cache_data yang sampai ke sini dan tercatat di metrik
+    with track_request("extract_answer") as request:
+        if QA_SERVICE_URL:
+            request["source"] = "service"
+            return remote_extract(question, context)
+        qa_model, qa_tokenizer = load_qa_reader()
+        with stage_timer("read", items=1):
+            return read_contexts(qa_model, qa_tokenizer, question, [context])[0]
 
 def render():
     col1, col2 = st.columns(2)
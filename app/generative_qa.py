@@ -1,13 +1,17 @@
-import os
-import json
-import numpy as np
 import streamlit as st
 import yaml
-from datasets import Dataset
-from transformers import pipeline
-import torch
 
-from utils.embedding import get_embeddings
+from utils.cache import LRUCache, file_fingerprint
+from utils.embedding import get_encoder, get_query_embeddings, normalize_question, MODEL_NAME as SBERT_MODEL_NAME, SBERT_BACKEND, SBERT_ONNX_PATH
+from utils.lazy import LazyResource
+from utils.semantic_cache import SemanticAnswerCache
+from utils.telemetry import register_cache, stage_timer, track_request
+from utils.reader import load_reader, READER_BACKEND, READER_ONNX_DIR
+from utils.passages import load_passage_store
+from utils.retriever import PassageRetriever, MANIFEST_PATH
+from utils.qa_engine import QAEngine
+from utils.rerank import warmup_reranker
+from utils.qa_client import QA_SERVICE_URL, remote_answer
 
 @st.cache_resource
 def load_config():
@@ -18,73 +22,156 @@ config = load_config()
 
 TRAIN_FILE = config["Config"]["DATASET_NAME"]            
 FAISS_INDEX_PATH = "faiss_index/my_index.faiss"
-CONTEXT_EMBEDDING_COL = "context_embedding"
-PIPELINE_NAME = config["Config"]["PIPELINE_NAME"]        
 FINETUNED_MODEL_NAME = config["Config"]["FINETUNED_MODEL_NAME"]  
 TOP_K = config.get("Config", {}).get("TOP_K", 5)         
+ANSWER_CACHE_SIZE = config["Config"].get("ANSWER_CACHE_SIZE", 1000)
+ANSWER_CACHE_TTL = config["Config"].get("ANSWER_CACHE_TTL", 3600)
+# Cache jawaban semantik: pertanyaan dengan cosine similarity embedding >= SEMANTIC_CACHE_THRESHOLD
+# terhadap pertanyaan yang sudah dijawab memakai jawabannya (0 entri -> tidak dipakai)
+SEMANTIC_CACHE_SIZE = config["Config"].get("SEMANTIC_CACHE_SIZE", 1000)
+SEMANTIC_CACHE_THRESHOLD = config["Config"].get("SEMANTIC_CACHE_THRESHOLD", 0.95)
 
-@st.cache_resource
-def load_qa_pipeline():
-    return pipeline(PIPELINE_NAME, model=FINETUNED_MODEL_NAME)
+# Cache jawaban (bersama untuk semua sesi), dibatasi jumlah entri dan umur entri
+answer_cache = LRUCache(ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL)
+register_cache("answer", answer_cache)
+semantic_cache = SemanticAnswerCache(SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD, ttl=ANSWER_CACHE_TTL)
+register_cache("semantic_answer", semantic_cache)
 
-qa_pipeline = load_qa_pipeline()
+def index_version():
+    """
+    Versi index (FAISS + passage store + BM25), dari manifest yang ditulis faiss_index.py
+    setelah semua file index selesai ditulis; berubah setiap faiss_index.py dijalankan ulang.
+    """
+    return file_fingerprint(MANIFEST_PATH, SBERT_MODEL_NAME, SBERT_BACKEND, SBERT_ONNX_PATH)
+
+def model_version():
+    """Versi model QA; berubah setiap trainer.py/export_onnx.py menyimpan model baru."""
+    return file_fingerprint(READER_BACKEND, FINETUNED_MODEL_NAME, READER_ONNX_DIR)
+
+# Model dan index tidak dimuat saat import, melainkan saat pertanyaan pertama (atau warmup).
+# Satu instance per proses, dipakai bersama oleh semua sesi dan thread warmup app.py
+qa_reader = LazyResource("generative_qa.reader", lambda: load_reader(READER_BACKEND))
+# Passage store Arrow ditulis oleh faiss_index.py dan cukup di-mmap di sini
+retriever = LazyResource(
+    "generative_qa.retriever",
+    lambda: PassageRetriever.load(FAISS_INDEX_PATH, load_passage_store(TRAIN_FILE))
+)
+
+# Argumen versi membuat resource dimuat ulang setelah index/model dibangun ulang
+def load_qa_reader(version=None):
+    return qa_reader.get(version)
+
+def load_retriever(version=None):
+    return retriever.get(version)
+
+def warmup():
+    """
+    Memuat encoder, retriever, dan reader lebih awal. Dipanggil dari thread warmup
+    app.py, sehingga tidak boleh memanggil fungsi Streamlit.
+    """
+    # Jika QA_SERVICE_URL diisi, model dijalankan oleh qa_service.py dan halaman ini hanya klien
+    if QA_SERVICE_URL:
+        return
+    get_encoder()
+    warmup_reranker()
+    load_retriever(index_version())
+    load_qa_reader(model_version())
+
+def load_engine(versions):
+    """QAEngine dari retriever dan reader versi (index_version, model_version)."""
+    qa_model, qa_tokenizer = load_qa_reader(versions[1])
+    return QAEngine(load_retriever(versions[0]), qa_model, qa_tokenizer, top_k=TOP_K)
+
+def lookup_answer_cache(input_question):
+    """:return: tuple (kunci cache, jawaban dari cache atau None)"""
+    with stage_timer("answer_cache"):
+        versions = (index_version(), model_version())
+        cache_key = (versions, normalize_question(input_question))
+        return cache_key, answer_cache.get(cache_key)
+
+def lookup_semantic_cache(input_question, versions):
+    """
+    Jawaban pertanyaan yang mirip (parafrase) dari semantic_cache.
+    Embedding yang dihitung di sini diteruskan ke QAEngine jika cache tidak kena,
+    sehingga retriever tidak meng-encode pertanyaan untuk kedua kalinya.
+    :return: tuple (embedding pertanyaan atau None, jawaban dari cache atau None)
+    """
+    if SEMANTIC_CACHE_SIZE <= 0:
+        return None, None
+    # Dicatat sebagai tahap "embed" seperti encode query di QAEngine, yang tidak
+    # meng-encode lagi karena embedding ini diteruskan ke engine
+    with stage_timer("embed", items=1):
+        embedding = get_query_embeddings([input_question])
+    with stage_timer("semantic_cache"):
+        return embedding, semantic_cache.get(embedding, versions)
+
+def store_answer(cache_key, embedding, answer):
+    answer_cache.put(cache_key, answer)
+    if embedding is not None:
+        semantic_cache.put(embedding, answer, cache_key[0])
 
-@st.cache_resource
-def load_train_dataset_with_faiss():
-    with open(TRAIN_FILE, "r", encoding='utf-8') as f:
-        squad_dict = json.load(f)
-
-    contexts, questions, answers, ids = [], [], [], []
-    for article in squad_dict["data"]:
-        for paragraph in article["paragraphs"]:
-            context = paragraph["context"]
-            for qa in paragraph["qas"]:
-                question = qa["question"]
-                id_ = qa["id"]
-                if "answers" not in qa or not qa["answers"]:
-                    answer = {"text": [""], "answer_start": [0]}
-                else:
-                    answer = {
-                        "text": [qa["answers"][0]["text"]],
-                        "answer_start": [qa["answers"][0]["answer_start"]]
-                    }
-                contexts.append(context)
-                questions.append(question)
-                ids.append(id_)
-                answers.append(answer)
-
-    dataset = Dataset.from_dict({
-        "id": ids,
-        "context": contexts,
-        "question": questions,
-        "answers": answers
-    })
-    dataset.load_faiss_index(CONTEXT_EMBEDDING_COL, FAISS_INDEX_PATH)
-    return dataset
-
-@st.cache_data
 def generate_answer(input_question):
-    dataset = load_train_dataset_with_faiss()
-    question_emb = get_embeddings([input_question]).cpu().detach().numpy()
-    scores, samples = dataset.get_nearest_examples(
-        CONTEXT_EMBEDDING_COL,
-        question_emb,
-        k=TOP_K
-    )
-    answer_scores = []
-    for idx, score in enumerate(scores):
-        context_text = samples["context"][idx]
-        ans = qa_pipeline(question=input_question, context=context_text)
-        if isinstance(ans, list) and len(ans) > 0:
-            ans = ans[0]
-        answer_scores.append(ans["score"])
-
-    best_idx = int(np.argmax(answer_scores))
-    best_context = samples["context"][best_idx]
-    final_answer = qa_pipeline(question=input_question, context=best_context)
-    if isinstance(final_answer, list) and len(final_answer) > 0:
-        final_answer = final_answer[0]
-    return final_answer["answer"], final_answer["score"]
+    with track_request("generate_answer") as request:
+        if QA_SERVICE_URL:
+            request["source"] = "service"
+            return remote_answer(input_question)
+
+        cache_key, cached = lookup_answer_cache(input_question)
+        if cached is not None:
+            request["source"] = "cache"
+            return cached
+
+        embedding, cached = lookup_semantic_cache(input_question, cache_key[0])
+        if cached is not None:
+            request["source"] = "semantic_cache"
+            answer_cache.put(cache_key, cached)
+            return cached
+
+        engine = load_engine(cache_key[0])
+        # Semua context hasil FAISS dibaca dalam satu batch (satu forward pass)
+        answer = engine.answer(input_question, embeddings=embedding)
+        store_answer(cache_key, embedding, answer)
+        return answer
+
+def generate_answer_events(input_question):
+    """
+    Versi bertahap dari generate_answer untuk render(): passage hasil FAISS, kandidat
+    jawaban terbaik setiap kali satu context selesai dibaca, lalu jawaban final.
+    Jawaban dari cache atau dari qa_service.py langsung berupa event "final".
+    """
+    with track_request("generate_answer") as request:
+        if QA_SERVICE_URL:
+            request["source"] = "service"
+            answer, score = remote_answer(input_question)
+            yield {"type": "final", "answer": answer, "score": score}
+            return
+
+        cache_key, cached = lookup_answer_cache(input_question)
+        if cached is not None:
+            request["source"] = "cache"
+            yield {"type": "final", "answer": cached[0], "score": cached[1]}
+            return
+
+        embedding, cached = lookup_semantic_cache(input_question, cache_key[0])
+        if cached is not None:
+            request["source"] = "semantic_cache"
+            answer_cache.put(cache_key, cached)
+            yield {"type": "final", "answer": cached[0], "score": cached[1]}
+            return
+
+        engine = load_engine(cache_key[0])
+        for event in engine.answer_events(input_question, embeddings=embedding):
+            if event["type"] == "final":
+                store_answer(cache_key, embedding, (event["answer"], event["score"]))
+            yield event
+
+def show_passages(passages):
+    with st.expander(f"Referensi ({len(passages)} passage)"):
+        for passage in passages:
+            title = ", ".join(passage.get("titles") or [])
+            context = passage["context"]
+            st.markdown(f"**{title}**" if title else "**-**")
+            st.caption(context if len(context) <= 400 else context[:400] + "...")
 
 def render():
     # ===== Tambahkan CSS untuk mengubah warna tombol Submit =====
@@ -117,9 +204,27 @@ def render():
         submit = st.form_submit_button("Submit", type="primary")
 
         if submit:
-            st.success("Selesai!")
-            answer, score = generate_answer(question)
-            st.subheader("Jawaban:")
-            st.info(f"🤖 {answer}")
-            st.subheader("Skor:")
-            st.info(score)
+            # Placeholder diisi bertahap: passage muncul segera setelah FAISS selesai,
+            # kandidat jawaban diperbarui setiap satu context selesai dibaca
+            status = st.empty()
+            answer_box = st.empty()
+            passages_box = st.empty()
+            status.info("Mencari referensi...")
+
+            for event in generate_answer_events(question):
+                if event["type"] == "passages":
+                    with passages_box.container():
+                        show_passages(event["passages"])
+                    status.info("Membaca referensi...")
+                elif event["type"] == "candidate":
+                    with answer_box.container():
+                        st.subheader("Jawaban sementara:")
+                        st.info(f"🤖 {event['answer']}")
+                        st.caption(f"Skor {event['score']:.4f} ({event['read']}/{event['total']} referensi dibaca)")
+                else:
+                    status.success("Selesai!")
+                    with answer_box.container():
+                        st.subheader("Jawaban:")
+                        st.info(f"🤖 {event['answer']}")
+                        st.subheader("Skor:")
+                        st.info(event["score"])
@@ -1,6 +1,46 @@
 import streamlit as st
 from streamlit_option_menu import option_menu
 import base64
+import yaml
+
+from utils.lazy import startup_timings
+from utils.telemetry import stage_summary, cache_stats, render_metrics
+
+with open('cfg/config.yaml', 'r', encoding='utf-8') as file:
+    config = yaml.safe_load(file)
+
+# Panel debug di sidebar: latensi per tahap, statistik cache, dan waktu startup proses ini
+DEBUG_PANEL = config["Config"].get("DEBUG_PANEL", False)
+
+def show_debug_panel():
+    with st.expander("Debug: latensi & cache"):
+        summary = stage_summary()
+        if summary:
+            st.caption("Latensi per tahap (ms, persentil perkiraan dari histogram)")
+            st.dataframe(
+                [{"tahap": stage, **{key: round(value, 1) for key, value in row.items()}} for stage, row in summary.items()],
+                hide_index=True
+            )
+        else:
+            st.caption("Belum ada pertanyaan yang dijawab.")
+
+        caches = cache_stats()
+        if caches:
+            st.caption("Cache")
+            st.dataframe(
+                [{"cache": name, **stats} for name, stats in caches.items()],
+                hide_index=True
+            )
+
+        timings = startup_timings()
+        if timings:
+            st.caption("Waktu startup (detik)")
+            st.dataframe(
+                [{"resource": name, "detik": round(seconds, 2)} for name, seconds in timings.items()],
+                hide_index=True
+            )
+
+        st.download_button("Unduh metrik (Prometheus)", render_metrics(), file_name="metrics.prom")
 
 def show():
     # 1. Ubah sidebar menjadi kontainer relative, setinggi layar (100vh), tanpa padding
@@ -69,4 +109,7 @@ def show():
             unsafe_allow_html=True
         )
 
+        if DEBUG_PANEL:
+            show_debug_panel()
+
     return selected
@@ -0,0 +1,122 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+import faiss
+import yaml
+
+from utils.embedding import encode_passages
+from utils.passages import PASSAGE_STORE_PATH, PassageStore, iter_squad_qas, iter_length_sorted_batches
+from utils.retriever import create_index, apply_search_params, IVF_NPROBE, HNSW_EF_SEARCH
+
+# === 1. BACA KONFIGURASI DARI FILE YAML ===
+with open('cfg/config.yaml', 'r', encoding='utf-8') as file:
+    config = yaml.safe_load(file)
+
+TRAIN_FILE = config["Config"]["DATASET_NAME"]
+TOP_K = config["Config"].get("TOP_K", 5)
+EMBED_BATCH_SIZE = config["Config"].get("EMBED_BATCH_SIZE", 64)
+
+INDEX_TYPES = ["Flat", "IVFFlat", "IVFPQ", "HNSW"]
+
+
+def load_questions(file_path, limit):
+    """Mengambil maksimal `limit` pertanyaan dari file SQuAD sebagai query benchmark."""
+    questions = [qa["question"] for _, _, qa in iter_squad_qas(file_path)]
+    return questions[:limit]
+
+
+def encode_corpus(store):
+    """Meng-encode semua passage di store; mengembalikan (embeddings float32, ids int64)."""
+    passages = [
+        {"context": context, "faiss_id": faiss_id}
+        for context, faiss_id in zip(store.table.column("context").to_pylist(), store.faiss_ids)
+    ]
+    embeddings, ids = [], []
+    for batch in iter_length_sorted_batches(passages, EMBED_BATCH_SIZE):
+        embeddings.append(encode_passages([p["context"] for p in batch], batch_size=EMBED_BATCH_SIZE))
+        ids.append(np.array([p["faiss_id"] for p in batch], dtype=np.int64))
+    return np.vstack(embeddings), np.concatenate(ids)
+
+
+def build(index_type, embeddings, ids):
+    index, train_size = create_index(embeddings.shape[1], index_type, num_vectors=len(embeddings))
+    start = time.perf_counter()
+    if not index.is_trained:
+        index.train(embeddings[:max(train_size, 1)])
+    index.add_with_ids(embeddings, ids)
+    return index, time.perf_counter() - start
+
+
+def measure(index, queries, ground_truth, k):
+    """Recall@k terhadap index Flat dan latensi per query (satu query per search)."""
+    latencies, hits = [], 0
+    for i in range(len(queries)):
+        start = time.perf_counter()
+        _, found = index.search(queries[i:i + 1], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(set(found[0].tolist()) & set(ground_truth[i].tolist()))
+    return {
+        f"recall@{k}": hits / (len(queries) * k),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark recall vs latensi untuk jenis FAISS index")
+    parser.add_argument("--types", nargs="+", default=INDEX_TYPES, choices=INDEX_TYPES)
+    parser.add_argument("--num-queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=TOP_K)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[IVF_NPROBE],
+                        help="Nilai nprobe yang diuji untuk index IVF")
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[HNSW_EF_SEARCH],
+                        help="Nilai efSearch yang diuji untuk index HNSW")
+    parser.add_argument("--output", default=None, help="Simpan hasil ke file JSON")
+    args = parser.parse_args()
+
+    # === 2. SIAPKAN KORPUS DAN QUERY ===
+    store = PassageStore.load(PASSAGE_STORE_PATH)
+    print(f"Meng-encode {len(store)} passage...")
+    embeddings, ids = encode_corpus(store)
+    queries = encode_passages(load_questions(TRAIN_FILE, args.num_queries), batch_size=EMBED_BATCH_SIZE)
+    k = min(args.k, len(store))
+
+    # Ground truth dari index exact (Flat)
+    flat_index, _ = build("Flat", embeddings, ids)
+    _, ground_truth = flat_index.search(queries, k)
+
+    # === 3. BANGUN DAN UKUR SETIAP JENIS INDEX ===
+    results = []
+    for index_type in args.types:
+        try:
+            index, build_seconds = build(index_type, embeddings, ids)
+        except ValueError as e:
+            # Misalnya IVFPQ pada korpus yang terlalu kecil untuk training codebook
+            print(f"{index_type:8s} dilewati: {e}")
+            continue
+        size_bytes = len(faiss.serialize_index(index))
+        if index_type in ("IVFFlat", "IVFPQ"):
+            settings = [{"nprobe": n} for n in args.nprobe]
+        elif index_type == "HNSW":
+            settings = [{"ef_search": ef} for ef in args.ef_search]
+        else:
+            settings = [{}]
+
+        for params in settings:
+            apply_search_params(index, **params)
+            row = {"index_type": index_type, **params, "build_s": build_seconds, "size_bytes": size_bytes}
+            row.update(measure(index, queries, ground_truth, k))
+            results.append(row)
+            print(
+                f"{index_type:8s} {str(params):20s} recall@{k}={row[f'recall@{k}']:.3f} "
+                f"p50={row['p50_ms']:.3f}ms p99={row['p99_ms']:.3f}ms "
+                f"size={size_bytes / 1e6:.2f}MB build={build_seconds:.2f}s"
+            )
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"num_passages": len(store), "num_queries": len(queries), "k": k, "results": results}, f, indent=2)
+        print(f"✅ Hasil benchmark disimpan di '{args.output}'")
@@ -0,0 +1,224 @@
+import os
+import json
+import time
+import random
+import argparse
+import resource
+import platform
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import yaml
+
+from utils.embedding import query_cache, MODEL_NAME as SBERT_MODEL_NAME, SBERT_BACKEND
+from utils.passages import iter_squad_qas, iter_question_file, load_passage_store
+from utils.qa_engine import QAEngine, TOP_K, ADAPTIVE_READING
+from utils.reader import READER_BACKEND
+from utils.rerank import RERANKER, READER_TOP_K
+from utils.retriever import INDEX_TYPE, HYBRID_RETRIEVAL
+
+# === 1. BACA KONFIGURASI DARI FILE YAML ===
+with open('cfg/config.yaml', 'r', encoding='utf-8') as file:
+    config = yaml.safe_load(file)
+
+TRAIN_FILE = config["Config"]["DATASET_NAME"]
+STAGES = ["embed", "search", "rerank", "read", "total"]
+
+
+def recorded_questions(path, limit):
+    """Pertanyaan dari file JSONL/CSV (misal log pertanyaan pengguna) atau file SQuAD (.json)."""
+    if path.endswith(".json"):
+        questions = [qa["question"] for _, _, qa in iter_squad_qas(path)]
+    else:
+        questions = [item["question"] for item in iter_question_file(path)]
+    return questions[:limit]
+
+
+def synthetic_questions(store, count, seed):
+    """
+    Pertanyaan sintetis dari passage store: potongan 3-8 kata acak dari passage acak
+    dengan awalan pertanyaan, sehingga panjang dan kosakata mirip pertanyaan asli.
+    """
+    rng = random.Random(seed)
+    prefixes = ["apa itu", "bagaimana cara", "apa penyebab", "apa gejala", "kapan"]
+    questions = []
+    for _ in range(count):
+        words = store[rng.randrange(len(store))]["context"].split()
+        length = rng.randint(3, 8)
+        start = rng.randrange(max(len(words) - length, 1))
+        questions.append(f"{rng.choice(prefixes)} {' '.join(words[start:start + length])}?")
+    return questions
+
+
+def run_local(engine, questions, concurrency):
+    """Setiap pertanyaan dijawab seperti generate_answer (tanpa cache jawaban)."""
+    def one(question):
+        timings, stats = {}, []
+        start = time.perf_counter()
+        engine.answer_batch([question], timings, stats)
+        timings["total"] = time.perf_counter() - start
+        timings["passages_read"] = stats[0]["read"]
+        return timings
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(one, questions))
+
+
+def run_service(url, questions, concurrency):
+    """Mengirim pertanyaan ke qa_service.py; hanya latensi total yang terukur."""
+    import requests
+
+    local = threading.local()
+
+    def one(question):
+        if not hasattr(local, "session"):
+            local.session = requests.Session()
+        start = time.perf_counter()
+        response = local.session.post(f"{url.rstrip('/')}/answer", json={"question": question}, timeout=60)
+        response.raise_for_status()
+        return {"total": time.perf_counter() - start}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(executor.map(one, questions))
+
+
+def summarize(samples):
+    """Persentil latensi (ms) per tahap."""
+    stages = {}
+    for stage in STAGES:
+        values = [s[stage] * 1000 for s in samples if stage in s]
+        if not values:
+            continue
+        stages[stage] = {
+            "mean_ms": float(np.mean(values)),
+            "p50_ms": float(np.percentile(values, 50)),
+            "p95_ms": float(np.percentile(values, 95)),
+            "p99_ms": float(np.percentile(values, 99)),
+        }
+    return stages
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result, baseline_path):
+    """Mencetak perubahan p50/p95 dan QPS terhadap hasil benchmark sebelumnya."""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"Dibandingkan dengan {baseline_path} (commit {baseline.get('commit')}):")
+    for stage, row in result["stages"].items():
+        old = baseline["stages"].get(stage)
+        if not old:
+            continue
+        print(f"  {stage:7s} " + " ".join(
+            f"{key}={row[key]:.1f}ms ({(row[key] - old[key]) / old[key] * 100 if old[key] else 0:+.0f}%)"
+            for key in ("p50_ms", "p95_ms")
+        ))
+    old_qps = baseline.get("qps") or 0
+    print(f"  qps     {result['qps']:.1f} ({(result['qps'] - old_qps) / old_qps * 100 if old_qps else 0:+.0f}%)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark latensi dan throughput retrieve-then-read")
+    parser.add_argument("--questions", default=None,
+                        help="File pertanyaan (.jsonl/.csv, atau SQuAD .json); default DATASET_NAME")
+    parser.add_argument("--synthetic", type=int, default=0, help="Jumlah pertanyaan sintetis tambahan")
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1])
+    parser.add_argument("--warmup", type=int, default=5, help="Jumlah query awal yang tidak diukur")
+    parser.add_argument("--query-cache", action="store_true",
+                        help="Aktifkan cache embedding pertanyaan (default mati agar encoder selalu diukur)")
+    parser.add_argument("--service-url", default=None, help="Ukur qa_service.py lewat HTTP, bukan engine lokal")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Simpan hasil ke file JSON")
+    parser.add_argument("--compare", default=None, help="File JSON hasil benchmark sebelumnya")
+    args = parser.parse_args()
+
+    # === 2. SIAPKAN ENGINE DAN PERTANYAAN ===
+    # Dengan --service-url model berjalan di qa_service.py; di sini cukup passage store (mmap)
+    # untuk pertanyaan sintetis, agar proses benchmark tidak ikut memuat engine
+    engine = None if args.service_url else QAEngine.load()
+    store = engine.retriever.store if engine is not None else load_passage_store(TRAIN_FILE)
+    if not args.query_cache:
+        query_cache.clear()
+        query_cache.max_entries = 0
+    questions = recorded_questions(args.questions or TRAIN_FILE, args.num_queries) if args.num_queries else []
+    questions += synthetic_questions(store, args.synthetic, args.seed)
+    random.Random(args.seed).shuffle(questions)
+    if not questions:
+        parser.error("tidak ada pertanyaan untuk benchmark")
+    print(f"{len(questions)} pertanyaan, concurrency {args.concurrency}")
+
+    run = (lambda qs, c: run_service(args.service_url, qs, c)) if args.service_url else (
+        lambda qs, c: run_local(engine, qs, c))
+    run(questions[:args.warmup], 1)
+
+    # === 3. UKUR SETIAP TINGKAT CONCURRENCY ===
+    runs = []
+    for concurrency in args.concurrency:
+        start = time.perf_counter()
+        samples = run(questions, concurrency)
+        elapsed = time.perf_counter() - start
+        row = {
+            "concurrency": concurrency,
+            "num_queries": len(samples),
+            "elapsed_s": elapsed,
+            "qps": len(samples) / elapsed,
+            "stages": summarize(samples),
+        }
+        if samples and "passages_read" in samples[0]:
+            row["passages_read_mean"] = float(np.mean([s["passages_read"] for s in samples]))
+        runs.append(row)
+        print(f"concurrency={concurrency} qps={row['qps']:.1f}")
+        if "passages_read_mean" in row:
+            print(f"  passage dibaca per pertanyaan: {row['passages_read_mean']:.2f}")
+        for stage, stats in row["stages"].items():
+            print(f"  {stage:7s} p50={stats['p50_ms']:.1f}ms p95={stats['p95_ms']:.1f}ms p99={stats['p99_ms']:.1f}ms")
+
+    # ru_maxrss dalam KB di Linux. Mode service: memori ada di proses qa_service.py, tidak diukur
+    peak_rss_mb = None
+    if args.service_url:
+        print("Peak RSS: tidak diukur (model berjalan di qa_service.py)")
+    else:
+        peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(f"Peak RSS: {peak_rss_mb:.0f} MB")
+
+    result = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "settings": {
+            "top_k": TOP_K,
+            "index_type": INDEX_TYPE,
+            "hybrid_retrieval": HYBRID_RETRIEVAL,
+            "reranker": RERANKER,
+            "reader_top_k": READER_TOP_K,
+            "adaptive_reading": ADAPTIVE_READING,
+            "reader_backend": READER_BACKEND,
+            "sbert_model": SBERT_MODEL_NAME,
+            "sbert_backend": SBERT_BACKEND,
+            "query_cache": args.query_cache,
+            "service_url": args.service_url,
+        },
+        "num_passages": len(store),
+        # None dengan --service-url (RSS proses benchmark bukan RSS layanan)
+        "peak_rss_mb": peak_rss_mb,
+        "runs": runs,
+        # Ringkasan dari run pertama, untuk dibandingkan antar commit
+        "qps": runs[0]["qps"],
+        "stages": runs[0]["stages"],
+    }
+
+    if args.compare:
+        compare(result, args.compare)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"✅ Hasil benchmark disimpan di '{args.output}'")
@@ -0,0 +1,97 @@
+import os
+import argparse
+import numpy as np
+import torch
+import yaml
+
+from utils.embedding import get_model, load_encoder, SBERT_ONNX_PATH
+from utils.passages import PASSAGE_STORE_PATH, PassageStore, iter_squad_qas
+from utils.retriever import PassageRetriever
+
+# === 1. MEMUAT KONFIGURASI DARI YAML === #
+with open('cfg/config.yaml', 'r', encoding='utf-8') as file:
+    config = yaml.safe_load(file)
+
+TRAIN_FILE = config["Config"]["DATASET_NAME"]
+TOP_K = config["Config"].get("TOP_K", 5)
+FAISS_INDEX_PATH = os.path.join("faiss_index", "my_index.faiss")
+
+
+class _HiddenStates(torch.nn.Module):
+    """Membungkus model transformer agar input posisional dan output last_hidden_state."""
+
+    def __init__(self, auto_model, input_names):
+        super().__init__()
+        self.auto_model = auto_model
+        self.input_names = input_names
+
+    def forward(self, *inputs):
+        return self.auto_model(**dict(zip(self.input_names, inputs))).last_hidden_state
+
+
+def export_encoder(output_path):
+    """Export modul Transformer dari SentenceTransformer ke ONNX (pooling dilakukan di NumPy)."""
+    model = get_model()
+    tokenizer = model.tokenizer
+    input_names = list(tokenizer.model_input_names)
+    dummy = tokenizer(["gejala demam berdarah"], return_tensors="pt")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    auto_model = model[0].auto_model.to("cpu").eval()
+    torch.onnx.export(
+        _HiddenStates(auto_model, input_names),
+        tuple(dummy[name] for name in input_names),
+        output_path,
+        input_names=input_names,
+        output_names=["last_hidden_state"],
+        dynamic_axes=dynamic_axes,
+        opset_version=14,
+    )
+
+
+def neighbour_check(backends, num_queries, k, onnx_path=SBERT_ONNX_PATH):
+    """
+    Membandingkan hasil pencarian FAISS index yang sudah ada antara encoder "torch" dan
+    backend lain: overlap top-k, kesamaan top-1, dan cosine similarity embedding query.
+    :param onnx_path: file ONNX yang dicek untuk backend "onnx" (hasil export, bukan path config)
+    """
+    store = PassageStore.load(PASSAGE_STORE_PATH)
+    retriever = PassageRetriever.load(FAISS_INDEX_PATH, store)
+    questions = [qa["question"] for _, _, qa in iter_squad_qas(TRAIN_FILE)][:num_queries]
+
+    model = get_model()
+    reference = load_encoder("torch", model).encode(questions)
+    _, reference_ids = retriever.index.search(reference, k)
+
+    for name in backends:
+        embeddings = load_encoder(name, model, onnx_path=onnx_path).encode(questions)
+        _, ids = retriever.index.search(embeddings, k)
+        overlap = np.mean([
+            len(set(a.tolist()) & set(b.tolist())) / k for a, b in zip(ids, reference_ids)
+        ])
+        top1 = np.mean(ids[:, 0] == reference_ids[:, 0])
+        cosine = np.sum(embeddings * reference, axis=1) / (
+            np.linalg.norm(embeddings, axis=1) * np.linalg.norm(reference, axis=1)
+        )
+        print(f"{name:6s} overlap@{k}={overlap:.3f} top1={top1:.3f} cosine min={cosine.min():.4f} mean={cosine.mean():.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export encoder Sentence-BERT ke ONNX dan cek hasil pencarian")
+    parser.add_argument("--output", default=SBERT_ONNX_PATH, help="Path file ONNX encoder")
+    parser.add_argument("--skip-export", action="store_true", help="Hanya jalankan pengecekan")
+    parser.add_argument("--check", action="store_true", help="Bandingkan nearest neighbour pada index yang ada")
+    parser.add_argument("--backends", nargs="+", default=["int8", "onnx"], choices=["int8", "onnx"])
+    parser.add_argument("--num-queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=TOP_K)
+    args = parser.parse_args()
+
+    # === 2. EXPORT ONNX === #
+    if not args.skip_export:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        export_encoder(args.output)
+        print(f"✅ Encoder ONNX disimpan di '{args.output}'")
+
+    # === 3. PENGECEKAN NEAREST NEIGHBOUR === #
+    if args.check:
+        neighbour_check(args.backends, args.num_queries, args.k, onnx_path=args.output)
@@ -0,0 +1,150 @@
+import os
+import argparse
+import numpy as np
+import torch
+import yaml
+from transformers import AutoTokenizer, AutoModelForQuestionAnswering
+
+from utils.reader import TorchQAModel, OnnxQAModel, READER_ONNX_DIR, ONNX_FILENAMES
+
+# === 1. MEMUAT KONFIGURASI DARI YAML === #
+with open('cfg/config.yaml', 'r', encoding='utf-8') as file:
+    config = yaml.safe_load(file)
+
+FINETUNED_MODEL_NAME = config["Config"]["FINETUNED_MODEL_NAME"]
+VAL_FILE = config["Config"]["VALIDATION_DATASET_NAME"]
+# Selisih EM/F1 (poin persen) maksimum antara backend ONNX dan PyTorch
+PARITY_TOLERANCE = config["Config"].get("READER_PARITY_TOLERANCE", 1.0)
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Membungkus model HF agar input posisional dan output berupa tuple (start, end)."""
+
+    def __init__(self, model, input_names):
+        super().__init__()
+        self.model = model
+        self.input_names = input_names
+
+    def forward(self, *inputs):
+        outputs = self.model(**dict(zip(self.input_names, inputs)))
+        return outputs.start_logits, outputs.end_logits
+
+
+def export_onnx(model, tokenizer, output_path):
+    input_names = list(tokenizer.model_input_names)
+    dummy = tokenizer(["apa gejala demam?"], ["demam adalah suhu tubuh tinggi."], return_tensors="pt")
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes.update({"start_logits": {0: "batch", 1: "sequence"}, "end_logits": {0: "batch", 1: "sequence"}})
+    torch.onnx.export(
+        _LogitsOnly(model.eval(), input_names),
+        tuple(dummy[name] for name in input_names),
+        output_path,
+        input_names=input_names,
+        output_names=["start_logits", "end_logits"],
+        dynamic_axes=dynamic_axes,
+        opset_version=14,
+    )
+
+
+def quantize_int8(onnx_path, output_path):
+    # Kuantisasi dinamis: bobot MatMul/Gemm int8, aktivasi dikuantisasi saat inferensi
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantize_dynamic(onnx_path, output_path, weight_type=QuantType.QInt8)
+
+
+def predict_logits(model, tokenizer, features, input_names, batch_size=32):
+    """
+    Logit start/end semua feature. Feature tanpa padding (DYNAMIC_PADDING) dipadding
+    per batch; logit antar batch disamakan panjangnya dengan -100 seperti Trainer.predict.
+    """
+    starts, ends = [], []
+    for i in range(0, len(features), batch_size):
+        batch = features[i:i + batch_size]
+        inputs = tokenizer.pad({name: batch[name] for name in input_names}, return_tensors="np")
+        start, end = model({name: inputs[name] for name in input_names})
+        starts.append(start)
+        ends.append(end)
+    width = max(logits.shape[1] for logits in starts)
+
+    def pad(logits):
+        return np.pad(logits, ((0, 0), (0, width - logits.shape[1])), constant_values=-100)
+
+    return np.concatenate([pad(s) for s in starts]), np.concatenate([pad(e) for e in ends])
+
+
+def parity_check(backends, tokenizer, tolerance, max_examples=None):
+    """
+    Membandingkan EM/F1 (utils.metric.compute_metrics) setiap backend dengan PyTorch
+    pada dataset validasi. Mengembalikan True jika semua selisih <= tolerance.
+    """
+    # Diimpor di sini karena memuat tokenizer preprocessing dan metric squad_v2
+    from utils.metric import compute_metrics
+    from utils.passages import load_squad_data
+    from utils.preprocess import preprocess_validation_examples, load_features
+
+    examples = load_squad_data(VAL_FILE)
+    if max_examples:
+        examples = examples.select(range(min(max_examples, len(examples))))
+        features = examples.map(
+            preprocess_validation_examples,
+            batched=True,
+            remove_columns=examples.column_names
+        )
+    else:
+        # Feature validasi yang sama dengan trainer.py, dari cache jika sudah ada
+        features = load_features(examples, preprocess_validation_examples, VAL_FILE)
+    input_names = [name for name in tokenizer.model_input_names if name in features.column_names]
+
+    results = {}
+    for name, model in backends.items():
+        start_logits, end_logits = predict_logits(model, tokenizer, features, input_names)
+        results[name] = compute_metrics(start_logits, end_logits, features, examples)
+        print(f"{name:10s} EM={results[name]['exact']:.2f} F1={results[name]['f1']:.2f}")
+
+    passed = True
+    for name, metrics in results.items():
+        if name == "pytorch":
+            continue
+        for key in ("exact", "f1"):
+            diff = abs(metrics[key] - results["pytorch"][key])
+            if diff > tolerance:
+                print(f"❌ {name}: selisih {key} {diff:.2f} > toleransi {tolerance}")
+                passed = False
+    if passed:
+        print(f"✅ Semua backend dalam toleransi {tolerance} poin terhadap PyTorch")
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export model QA hasil trainer.py ke ONNX (fp32 dan int8)")
+    parser.add_argument("--model", default=FINETUNED_MODEL_NAME, help="Path/nama model hasil fine-tuning")
+    parser.add_argument("--output", default=READER_ONNX_DIR, help="Direktori output ONNX")
+    parser.add_argument("--check", action="store_true", help="Jalankan parity check EM/F1 setelah export")
+    parser.add_argument("--tolerance", type=float, default=PARITY_TOLERANCE)
+    parser.add_argument("--max-examples", type=int, default=None, help="Batasi jumlah contoh validasi untuk parity check")
+    args = parser.parse_args()
+
+    # === 2. MEMUAT MODEL DAN TOKENIZER === #
+    tokenizer = AutoTokenizer.from_pretrained(args.model)
+    model = AutoModelForQuestionAnswering.from_pretrained(args.model)
+    os.makedirs(args.output, exist_ok=True)
+
+    # === 3. EXPORT ONNX DAN KUANTISASI INT8 === #
+    onnx_path = os.path.join(args.output, ONNX_FILENAMES["onnx"])
+    int8_path = os.path.join(args.output, ONNX_FILENAMES["onnx-int8"])
+    export_onnx(model, tokenizer, onnx_path)
+    print(f"✅ Model ONNX disimpan di '{onnx_path}'")
+    quantize_int8(onnx_path, int8_path)
+    print(f"✅ Model ONNX int8 disimpan di '{int8_path}'")
+    tokenizer.save_pretrained(args.output)
+
+    # === 4. PARITY CHECK EM/F1 === #
+    if args.check:
+        backends = {
+            "pytorch": TorchQAModel(model),
+            "onnx": OnnxQAModel(onnx_path),
+            "onnx-int8": OnnxQAModel(int8_path),
+        }
+        if not parity_check(backends, tokenizer, args.tolerance, args.max_examples):
+            raise SystemExit(1)
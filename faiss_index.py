@@ -1,15 +1,20 @@
 import os
 import json
-import torch
+import argparse
+import numpy as np
 import faiss
-from datasets import Dataset
 import yaml
 
-# Fungsi get_embeddings harus ada di utils/embedding.py
-# Pastikan sudah menyesuaikan model embedding (misalnya Sentence-BERT)
-from utils.embedding import get_embeddings
-
-device = torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu")
+from utils.embedding import (
+    encode_passages, get_embedding_dim, MODEL_NAME as SBERT_MODEL_NAME, SBERT_BACKEND, SBERT_ONNX_PATH
+)
+from utils.passages import (
+    PASSAGE_STORE_PATH, PassageStore, iter_squad_passages, iter_length_sorted_batches,
+    passage_hash, passage_faiss_id
+)
+from utils.reader import READER_PRETOKENIZED, load_reader_tokenizer, tokenize_passages, tokenizer_fingerprint
+from utils.retriever import INDEX_TYPE, MANIFEST_PATH, create_index, supports_remove, write_index
+from utils.sparse import BM25_INDEX_PATH, BM25Index
 
 # === 1. BACA KONFIGURASI DARI FILE YAML ===
 with open('cfg/config.yaml', 'r', encoding='utf-8') as file:
@@ -19,68 +24,177 @@ TRAIN_FILE = config["Config"]["DATASET_NAME"]  # ex: "data/train.json"
 FAISS_INDEX_DIR = "faiss_index"
 FAISS_INDEX_PATH = os.path.join(FAISS_INDEX_DIR, "my_index.faiss")
 
-# Kita tentukan nama kolom embedding yang akan dibuat
-CONTEXT_EMBEDDING_COL = "context_embedding"
+# Mode index: "passage" -> satu vektor per paragraf unik (default),
+#             "question" -> satu vektor per baris pertanyaan (perilaku lama)
+INDEX_MODE = config["Config"].get("INDEX_MODE", "passage")
+
+# Jumlah passage yang di-encode dalam satu panggilan SentenceTransformer
+EMBED_BATCH_SIZE = config["Config"].get("EMBED_BATCH_SIZE", 64)
 
-# === 2. FUNGSI MEMUAT DATASET SQUAD DARI FILE LOKAL (TRAIN) ===
-def load_squad_data(file_path):
+def add_passages(index, passages, batch_size=EMBED_BATCH_SIZE, train_size=0):
     """
-    Membaca file JSON berformat SQuAD dan mengonversinya ke Dataset Hugging Face.
-    Menghasilkan kolom: [id, context, question, answers].
+    Meng-encode passage per batch (diurutkan per panjang agar padding kecil) dan
+    langsung menambahkan vektor float32 ke FAISS index, tanpa kolom embedding di Dataset.
+    Setiap vektor disimpan dengan id dari passage_faiss_id. Index yang perlu dilatih
+    (IVF/PQ) dilatih dengan train_size vektor pertama sebelum vektor ditambahkan.
+    :param passages: iterable passage dari iter_squad_passages
+    :return: jumlah passage yang ditambahkan
     """
-    with open(file_path, "r", encoding="utf-8") as f:
-        squad_dict = json.load(f)
-
-    contexts, questions, answers, ids = [], [], [], []
-    for article in squad_dict["data"]:
-        for paragraph in article["paragraphs"]:
-            context = paragraph["context"]
-            for qa in paragraph["qas"]:
-                question = qa["question"]
-                id_ = qa["id"]
-                if "answers" not in qa or not qa["answers"]:
-                    answer = {"text": [""], "answer_start": [0]}
-                else:
-                    answer = {
-                        "text": [qa["answers"][0]["text"]],
-                        "answer_start": [qa["answers"][0]["answer_start"]]
-                    }
-                contexts.append(context)
-                questions.append(question)
-                ids.append(id_)
-                answers.append(answer)
-
-    return Dataset.from_dict({
-        "id": ids,
-        "context": contexts,
-        "question": questions,
-        "answers": answers
-    })
+    added = 0
+    pending_embeddings, pending_ids = [], []
+    for batch in iter_length_sorted_batches(passages, batch_size):
+        embeddings = encode_passages([p["context"] for p in batch], batch_size=batch_size)
+        ids = np.array([passage_faiss_id(p["id"]) for p in batch], dtype=np.int64)
 
-if __name__ == "__main__":
-    # === 3. MUAT DATASET TRAIN ===
-    train_dataset = load_squad_data(TRAIN_FILE)
-    
-    # (Opsional) Filter contoh yang benar-benar punya context (biasanya selalu ada)
-    # train_dataset = train_dataset.filter(lambda x: len(x["context"].strip()) > 0)
+        if not index.is_trained:
+            pending_embeddings.append(embeddings)
+            pending_ids.append(ids)
+            if sum(len(e) for e in pending_embeddings) < train_size:
+                continue
+            embeddings, ids = np.vstack(pending_embeddings), np.concatenate(pending_ids)
+            pending_embeddings, pending_ids = [], []
+            index.train(embeddings)
+
+        index.add_with_ids(embeddings, ids)
+        added += len(ids)
+        print(f"  {added} passage ter-index", end="\r")
+
+    # Korpus lebih kecil dari train_size: latih dengan semua vektor yang ada
+    if pending_embeddings:
+        embeddings, ids = np.vstack(pending_embeddings), np.concatenate(pending_ids)
+        index.train(embeddings)
+        index.add_with_ids(embeddings, ids)
+        added += len(ids)
+    print()
+    return added
+
+def make_manifest(passages):
+    return {
+        "index_mode": INDEX_MODE,
+        "sbert_model": SBERT_MODEL_NAME,
+        "sbert_backend": encoder_backend(),
+        "index_type": INDEX_TYPE,
+        "passages": {p["id"]: passage_hash(p["context"]) for p in passages}
+    }
+
+def encoder_backend():
+    """Backend encoder yang menghasilkan vektor index (path ONNX ikut dicatat untuk backend onnx)."""
+    return f"onnx:{SBERT_ONNX_PATH}" if SBERT_BACKEND == "onnx" else SBERT_BACKEND
+
+def load_manifest():
+    if not (os.path.exists(MANIFEST_PATH) and os.path.exists(FAISS_INDEX_PATH)):
+        return None
+    with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def build_faiss_index(passages):
+    """Build penuh: encode semua passage ke index baru sesuai INDEX_TYPE."""
+    index, train_size = create_index(get_embedding_dim(), INDEX_TYPE, num_vectors=len(passages))
+    add_passages(index, passages, train_size=train_size)
+    return index
+
+def update_faiss_index(passages, manifest):
+    """
+    Build inkremental: hanya passage baru/berubah yang di-encode, vektor passage yang
+    dihapus atau berubah dikeluarkan dari index lama. Mengembalikan None jika index
+    lama tidak bisa diperbarui (build penuh diperlukan).
+    """
+    if (manifest.get("index_mode") != INDEX_MODE
+            or manifest.get("sbert_model") != SBERT_MODEL_NAME
+            or manifest.get("sbert_backend", "torch") != encoder_backend()
+            or manifest.get("index_type", "Flat") != INDEX_TYPE):
+        # Vektor dari encoder lain (misalnya int8/onnx) tidak boleh dicampur dengan vektor lama
+        print("Mode index, jenis index, model, atau backend embedding berubah, build penuh diperlukan.")
+        return None
+    index = faiss.read_index(FAISS_INDEX_PATH)
+    if not isinstance(index, faiss.IndexIDMap2):
+        print("Index lama tidak memakai IDMap, build penuh diperlukan.")
+        return None
+
+    old_hashes = manifest["passages"]
+    new_hashes = {p["id"]: passage_hash(p["context"]) for p in passages}
+    stale = [pid for pid, h in old_hashes.items() if new_hashes.get(pid) != h]
+    changed = [p for p in passages if old_hashes.get(p["id"]) != new_hashes[p["id"]]]
+
+    if stale and not supports_remove(index):
+        print(f"Index {INDEX_TYPE} tidak mendukung penghapusan vektor, build penuh diperlukan.")
+        return None
+    if stale:
+        index.remove_ids(np.array([passage_faiss_id(pid) for pid in stale], dtype=np.int64))
+    add_passages(index, changed)
+    print(f"Inkremental: {len(changed)} passage di-encode, {len(stale)} vektor lama dihapus")
+    return index
 
-    # === 4. BUAT KOLOM EMBEDDING DARI context ===
-    # Kita memetakan embedding untuk setiap context, lalu simpan di kolom CONTEXT_EMBEDDING_COL
-    def make_context_embedding(example):
-        emb = get_embeddings([example["context"]])  # Hasil shape [1, emb_dim]
-        return {CONTEXT_EMBEDDING_COL: emb.detach().cpu().numpy()[0]}
+def tokenize_for_reader(passages):
+    """
+    Token context semua passage untuk tokenizer reader, disimpan di passage store agar
+    reader tidak menokenisasi ulang passage saat query.
+    :return: tuple (context_tokens, sidik jari tokenizer), atau (None, None) jika
+             READER_PRETOKENIZED mati atau model reader belum ada
+    """
+    if not READER_PRETOKENIZED:
+        return None, None
+    try:
+        tokenizer = load_reader_tokenizer()
+    except OSError as e:
+        print(f"⚠️ Tokenizer reader tidak bisa dimuat, passage tidak ditokenisasi: {e}")
+        return None, None
+    fingerprint = tokenizer_fingerprint(tokenizer)
+    if fingerprint is None:
+        print("⚠️ Tokenizer reader bukan tokenizer fast, passage tidak ditokenisasi")
+        return None, None
+    return tokenize_passages(tokenizer, [p["context"] for p in passages]), fingerprint
 
-    embeddings_dataset = train_dataset.map(
-        make_context_embedding,
-        batched=False
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Membangun FAISS index dari dataset train")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Hanya encode passage yang baru/berubah berdasarkan manifest"
     )
+    cli_args = parser.parse_args()
 
-    # === 5. BANGUN FAISS INDEX DARI KOLOM context_embedding ===
-    embeddings_dataset.add_faiss_index(column=CONTEXT_EMBEDDING_COL)
+    # === 2. MUAT PASSAGE DARI DATASET TRAIN ===
+    # Pada mode "passage", paragraf yang dipakai banyak pertanyaan hanya di-embed sekali
+    passages = list(iter_squad_passages(TRAIN_FILE, dedup=(INDEX_MODE == "passage")))
+    print(f"Mode index '{INDEX_MODE}': {len(passages)} passage")
+
+    # (Opsional) Filter contoh yang benar-benar punya context (biasanya selalu ada)
+    # passages = [p for p in passages if len(p["context"].strip()) > 0]
+
+    # === 3. ENCODE PER BATCH DAN BANGUN/PERBARUI FAISS INDEX ===
+    index = None
+    if cli_args.incremental:
+        manifest = load_manifest()
+        if manifest is None:
+            print("Manifest belum ada, build penuh diperlukan.")
+        else:
+            index = update_faiss_index(passages, manifest)
+    if index is None:
+        index = build_faiss_index(passages)
 
     # Pastikan direktori untuk menyimpan index ada
     os.makedirs(FAISS_INDEX_DIR, exist_ok=True)
 
-    # === 6. SIMPAN FAISS INDEX KE FILE ===
-    embeddings_dataset.save_faiss_index(CONTEXT_EMBEDDING_COL, FAISS_INDEX_PATH)
-    print(f"✅ FAISS index berhasil disimpan di '{FAISS_INDEX_PATH}'")
+    # === 4. SIMPAN FAISS INDEX, PASSAGE STORE, INDEX BM25, DAN MANIFEST KE FILE ===
+    write_index(index, FAISS_INDEX_PATH)
+    print(f"✅ FAISS index berhasil disimpan di '{FAISS_INDEX_PATH}' ({index.ntotal} vektor)")
+
+    # Id vektor di index diturunkan dari id passage, sehingga hasil pencarian
+    # bisa dipetakan kembali ke artikel dan pertanyaan sumbernya. Token context untuk
+    # tokenizer reader ikut disimpan (saat query hanya pertanyaan yang ditokenisasi)
+    context_tokens, reader_tokenizer = tokenize_for_reader(passages)
+    PassageStore.from_passages(passages, context_tokens, reader_tokenizer).save(PASSAGE_STORE_PATH)
+    print(f"✅ Passage store berhasil disimpan di '{PASSAGE_STORE_PATH}'")
+
+    # Index BM25 untuk retrieval hybrid; selalu dibangun penuh (tanpa model, cepat)
+    BM25Index.build(passages).save(BM25_INDEX_PATH)
+    print(f"✅ Index BM25 berhasil disimpan di '{BM25_INDEX_PATH}'")
+
+    # Manifest (hash isi passage untuk build inkremental) ditulis terakhir dan atomik:
+    # aplikasi memuat ulang index hanya saat manifest berubah, yaitu setelah semua file siap
+    tmp_path = f"{MANIFEST_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(make_manifest(passages), f)
+    os.replace(tmp_path, MANIFEST_PATH)
+    print(f"✅ Manifest berhasil disimpan di '{MANIFEST_PATH}'")
@@ -1,47 +1,163 @@
-from faiss_index import generate_vector_database, get_embeddings
-from transformers import pipeline
-from datasets import load_dataset
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import threading
+import multiprocessing
+
 import yaml
 
-# Load the YAML file
-with open('cfg/config.yaml', 'r') as file:
+from utils.passages import iter_question_file
+from utils.qa_engine import QAEngine, set_worker_threads
+from utils.reader import READER_BACKEND
+
+# === 1. MEMUAT KONFIGURASI DARI YAML === #
+with open('cfg/config.yaml', 'r', encoding='utf-8') as file:
     config = yaml.safe_load(file)
 
-DATASET_NAME = config["Config"]["DATSET_NAME"]
-EMBEDDING_COLUMN = config["Config"]["EMBEDDING_COLUMN"]
-PIPELINE_NAME = config["Config"]["PIPELINE_NAME"]
-FINETUNED_MODEL_NAME = config["Config"]["FINETUNED_MODEL_NAME"]
-TOP_K = 5
+# Jumlah pertanyaan per batch (satu encode embedding dan satu forward pass reader)
+QA_BATCH_SIZE = config["Config"].get("QA_BATCH_SIZE", 32)
+STAGES = ["embed", "search", "rerank", "read"]
+
+# Engine dimuat di proses induk lalu diwarisi worker (fork, copy-on-write)
+_engine = None
+
+
+def iter_batches(items, batch_size, slots=None):
+    """
+    Mengelompokkan aliran item menjadi list berukuran batch_size. Jika slots
+    (semaphore) diberikan, setiap batch menunggu slot kosong agar jumlah batch yang
+    sedang diproses worker tetap terbatas dan file input tidak dibaca sekaligus.
+    """
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            if slots is not None:
+                slots.acquire()
+            yield batch
+            batch = []
+    if batch:
+        if slots is not None:
+            slots.acquire()
+        yield batch
+
+
+def answer_batch(batch):
+    """Menjawab satu batch; waktu tiap tahap dibagi rata ke setiap pertanyaan (ms)."""
+    timings = {}
+    start = time.perf_counter()
+    answers = _engine.answer_batch([item["question"] for item in batch], timings)
+    total = time.perf_counter() - start
+
+    records = []
+    for item, (answer, score) in zip(batch, answers):
+        record = {"id": item["id"], "question": item["question"], "answer": answer, "score": score}
+        for stage in STAGES:
+            record[f"{stage}_ms"] = timings.get(stage, 0.0) * 1000 / len(batch)
+        record["total_ms"] = total * 1000 / len(batch)
+        records.append(record)
+    return records
+
+
+def _init_worker(threads):
+    set_worker_threads(threads)
+    _engine.after_fork()
 
-# Load dataset and Faiss index
-dataset = load_dataset(DATASET_NAME, split = "train+validation")
-dataset = dataset.filter(
-    lambda x: len(x['answers']['text']) > 0
-)
-dataset.load_faiss_index(EMBEDDING_COLUMN, "faiss_index/my_index.faiss")
 
-# Pipeline
-pipe = pipeline(PIPELINE_NAME, model = FINETUNED_MODEL_NAME)
+class ResultWriter:
+    """Menulis hasil ke JSONL atau CSV (sesuai ekstensi file output), flush per batch."""
 
-# Input question
-input_question = "When did Beyonce start becoming popular?"
+    FIELDS = ["id", "question", "answer", "score"] + [f"{stage}_ms" for stage in STAGES] + ["total_ms"]
 
-input_question_embedding = get_embeddings([input_question])
-input_question_embedding = input_question_embedding.cpu().detach().numpy()
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.file = open(path, "w", encoding="utf-8", newline="")
+        self.csv = csv.DictWriter(self.file, fieldnames=self.FIELDS) if path.endswith(".csv") else None
+        if self.csv is not None:
+            self.csv.writeheader()
+
+    def write(self, records):
+        for record in records:
+            if self.csv is not None:
+                self.csv.writerow(record)
+            else:
+                self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
 
-scores, samples = dataset.get_nearest_examples(
-    EMBEDDING_COLUMN, input_question_embedding, k = TOP_K
-)
 
 if __name__ == "__main__":
-  print(f'Input question: {input_question}')
-  for idx, score in enumerate(scores):
-    question = samples["question"][idx]
-    context = samples["context"][idx]
-    answer = pipe(
-                    question=question ,
-                  context=context )
-    print(f'Top {idx + 1}\tScore: {score}')
-    print(f'Context: {context}')
-    print(f'Answer: {answer}')
-    print("*-----------------------------------*")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Menjawab pertanyaan dari file JSONL/CSV secara batch")
+    parser.add_argument("input", nargs="?", help="File pertanyaan (.jsonl atau .csv)")
+    parser.add_argument("--output", default="results/answers.jsonl", help="File hasil (.jsonl atau .csv)")
+    parser.add_argument("--question", help="Jawab satu pertanyaan saja lalu cetak hasilnya")
+    parser.add_argument("--question-field", default="question")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--batch-size", type=int, default=QA_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=1, help="Jumlah proses worker")
+    parser.add_argument("--threads", type=int, default=0,
+                        help="Thread PyTorch/FAISS per worker (0 = core / worker)")
+    args = parser.parse_args()
+    if not args.input and not args.question:
+        parser.error("berikan file input atau --question")
+
+    # === 2. MEMUAT RETRIEVER DAN READER === #
+    # Reader ONNX Runtime tidak aman di-fork, jadi dimuat di setiap worker
+    use_pool = args.workers > 1 and args.input
+    _engine = QAEngine.load(with_reader=not (use_pool and READER_BACKEND != "pytorch"))
+    threads = args.threads if args.threads > 0 else max(1, (os.cpu_count() or 1) // max(args.workers, 1))
+
+    if args.question:
+        set_worker_threads(threads)
+        record = answer_batch([{"id": 0, "question": args.question}])[0]
+        print(json.dumps(record, ensure_ascii=False, indent=2))
+        sys.exit(0)
+
+    # === 3. MENJAWAB PERTANYAAN PER BATCH === #
+    writer = ResultWriter(args.output)
+    stage_totals = {stage: 0.0 for stage in STAGES}
+    num_questions = 0
+    start = time.perf_counter()
+
+    questions = iter_question_file(args.input, args.question_field, args.id_field)
+    if use_pool:
+        # Maksimal 2 batch per worker yang sedang diproses/menunggu
+        slots = threading.BoundedSemaphore(args.workers * 2)
+        pool = multiprocessing.get_context("fork").Pool(
+            args.workers, initializer=_init_worker, initargs=(threads,)
+        )
+        results = pool.imap(answer_batch, iter_batches(questions, args.batch_size, slots))
+    else:
+        set_worker_threads(threads)
+        slots, pool = None, None
+        results = map(answer_batch, iter_batches(questions, args.batch_size))
+
+    for records in results:
+        writer.write(records)
+        if slots is not None:
+            slots.release()
+        num_questions += len(records)
+        for record in records:
+            for stage in STAGES:
+                stage_totals[stage] += record[f"{stage}_ms"]
+        print(f"  {num_questions} pertanyaan dijawab", end="\r")
+
+    if pool is not None:
+        pool.close()
+        pool.join()
+    writer.close()
+    elapsed = time.perf_counter() - start
+
+    # === 4. RINGKASAN === #
+    print()
+    print(f"✅ {num_questions} jawaban disimpan di '{args.output}' ({elapsed:.1f}s, "
+          f"{num_questions / elapsed if elapsed else 0:.1f} pertanyaan/s, {args.workers} worker)")
+    if num_questions:
+        print("Rata-rata per pertanyaan: " + ", ".join(
+            f"{stage}={total / num_questions:.1f}ms" for stage, total in stage_totals.items()
+        ))
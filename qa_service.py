@@ -0,0 +1,263 @@
+import gc
+import os
+import time
+import signal
+import socket
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+from aiohttp import web
+
+from utils.cache import LRUCache
+from utils.embedding import normalize_question
+from utils.qa_engine import QAEngine, set_worker_threads
+from utils.reader import READER_BACKEND
+from utils.telemetry import register_cache, render_metrics, stage_timer, track_request
+
+# === 1. MEMUAT KONFIGURASI DARI YAML === #
+with open('cfg/config.yaml', 'r', encoding='utf-8') as file:
+    config = yaml.safe_load(file)
+
+SERVICE_HOST = config["Config"].get("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = config["Config"].get("SERVICE_PORT", 8000)
+# Micro-batching: permintaan yang datang bersamaan digabung hingga ukuran batch maksimum
+# atau hingga waktu tunggu maksimum (milidetik) sejak permintaan pertama di batch
+SERVICE_MAX_BATCH_SIZE = config["Config"].get("SERVICE_MAX_BATCH_SIZE", 16)
+SERVICE_MAX_WAIT_MS = config["Config"].get("SERVICE_MAX_WAIT_MS", 10)
+# Jumlah proses worker (pre-fork); 1 -> satu proses tanpa fork
+SERVICE_WORKERS = config["Config"].get("SERVICE_WORKERS", 1)
+# Thread PyTorch/FAISS per worker; 0 -> jumlah core dibagi jumlah worker
+SERVICE_THREADS_PER_WORKER = config["Config"].get("SERVICE_THREADS_PER_WORKER", 0)
+ANSWER_CACHE_SIZE = config["Config"].get("ANSWER_CACHE_SIZE", 1000)
+ANSWER_CACHE_TTL = config["Config"].get("ANSWER_CACHE_TTL", 3600)
+
+
+class MicroBatcher:
+    """
+    Mengumpulkan permintaan dari banyak koneksi ke dalam antrean asyncio dan menjalankan
+    `handler(items) -> list hasil` per batch di thread terpisah, sehingga event loop
+    tetap bebas menerima permintaan selama model berjalan.
+    """
+
+    def __init__(self, handler, executor, max_batch_size, max_wait_ms):
+        self.handler = handler
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Ambil juga permintaan yang sudah menunggu tanpa menambah waktu tunggu
+        while len(batch) < self.max_batch_size and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self.handler, items)
+            except Exception as exc:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "queued": self.queue.qsize(),
+        }
+
+
+async def read_text_fields(request, *names):
+    """
+    Field string wajib dari body JSON permintaan.
+    :raise web.HTTPBadRequest: body bukan objek JSON, atau field kosong/bukan string
+    """
+    try:
+        body = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="Body harus berupa JSON")
+    if not isinstance(body, dict):
+        raise web.HTTPBadRequest(text="Body harus berupa objek JSON")
+    values = [body.get(name) for name in names]
+    if not all(isinstance(value, str) and value.strip() for value in values):
+        fields = " dan ".join(f"'{name}'" for name in names)
+        raise web.HTTPBadRequest(text=f"Field {fields} wajib diisi (string)")
+    return values
+
+
+def create_app(engine, max_batch_size=SERVICE_MAX_BATCH_SIZE, max_wait_ms=SERVICE_MAX_WAIT_MS):
+    # Satu thread model: batch dijalankan berurutan, paralelisme ada di dalam batch
+    executor = ThreadPoolExecutor(max_workers=1)
+    answer_cache = LRUCache(ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL)
+    register_cache("service_answer", answer_cache)
+    answer_batcher = MicroBatcher(engine.answer_batch, executor, max_batch_size, max_wait_ms)
+    extract_batcher = MicroBatcher(
+        lambda pairs: engine.extract_batch([q for q, _ in pairs], [c for _, c in pairs]),
+        executor, max_batch_size, max_wait_ms
+    )
+
+    async def answer(request):
+        question, = await read_text_fields(request, "question")
+        with track_request("service_answer", source="cache") as info:
+            with stage_timer("answer_cache"):
+                key = normalize_question(question)
+                cached = answer_cache.get(key)
+            if cached is None:
+                info["source"] = "model"
+                cached = await answer_batcher.submit(question)
+                answer_cache.put(key, cached)
+        return web.json_response({"answer": cached[0], "score": cached[1]})
+
+    async def extract(request):
+        question, context = await read_text_fields(request, "question", "context")
+        with track_request("service_extract"):
+            result = await extract_batcher.submit((question, context))
+        return web.json_response(result)
+
+    async def health(request):
+        return web.json_response({"status": "ok"})
+
+    async def metrics(request):
+        # Metrik per proses: dengan beberapa worker, setiap scrape dilayani salah satunya
+        # (lihat header X-Worker-Pid); untuk semua worker gunakan METRICS_FILE dengan {pid}
+        return web.Response(text=render_metrics(), headers={
+            "Content-Type": "text/plain; version=0.0.4; charset=utf-8",
+            "X-Worker-Pid": str(os.getpid()),
+        })
+
+    async def stats(request):
+        return web.json_response({
+            "pid": os.getpid(),
+            "answer_batcher": answer_batcher.stats(),
+            "extract_batcher": extract_batcher.stats(),
+            "answer_cache": answer_cache.stats(),
+        })
+
+    async def start_batchers(app):
+        app["batcher_tasks"] = [
+            asyncio.create_task(answer_batcher.run()),
+            asyncio.create_task(extract_batcher.run()),
+        ]
+
+    async def stop_batchers(app):
+        for task in app["batcher_tasks"]:
+            task.cancel()
+        executor.shutdown(wait=False)
+
+    app = web.Application()
+    app.add_routes([
+        web.post("/answer", answer),
+        web.post("/extract", extract),
+        web.get("/health", health),
+        web.get("/stats", stats),
+        web.get("/metrics", metrics),
+    ])
+    app.on_startup.append(start_batchers)
+    app.on_cleanup.append(stop_batchers)
+    return app
+
+
+def threads_per_worker(workers, threads=SERVICE_THREADS_PER_WORKER):
+    return threads if threads > 0 else max(1, (os.cpu_count() or 1) // workers)
+
+
+def run_workers(engine, workers, host, port, max_batch_size, max_wait_ms, threads):
+    """
+    Pre-fork: engine (bobot model PyTorch, FAISS index ter-mmap, passage store Arrow)
+    sudah dimuat di proses induk, lalu `workers` proses anak di-fork dan berbagi satu
+    socket. Halaman memori read-only dibagi copy-on-write, sehingga RAM tidak
+    berlipat sebanyak jumlah worker. Sesi ONNX Runtime dibuat ulang di setiap worker.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+
+    # Objek yang sudah ada dipindah ke generasi permanen agar GC di worker tidak
+    # menulis ke halaman memori objek tersebut (yang akan memicu salinan)
+    gc.freeze()
+
+    children = []
+    for worker_id in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            set_worker_threads(threads)
+            engine.after_fork()
+            print(f"Worker {worker_id} (pid {os.getpid()}) siap, {threads} thread")
+            web.run_app(create_app(engine, max_batch_size, max_wait_ms), sock=sock, print=None)
+            os._exit(0)
+        children.append(pid)
+
+    def stop(signum, frame):
+        for child in children:
+            try:
+                os.kill(child, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    print(f"======== Melayani http://{host}:{port} dengan {workers} worker ========")
+    for child in children:
+        os.waitpid(child, 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Layanan HTTP tanya-jawab dengan micro-batching")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--max-batch-size", type=int, default=SERVICE_MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=SERVICE_MAX_WAIT_MS)
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS)
+    parser.add_argument("--threads", type=int, default=SERVICE_THREADS_PER_WORKER,
+                        help="Thread PyTorch/FAISS per worker (0 = core / worker)")
+    args = parser.parse_args()
+
+    # === 2. MEMUAT RETRIEVER DAN READER SEKALI UNTUK SEMUA PERMINTAAN === #
+    # Reader ONNX Runtime tidak aman di-fork, jadi dimuat di setiap worker
+    prefork = args.workers > 1
+    engine = QAEngine.load(with_reader=not (prefork and READER_BACKEND != "pytorch"))
+    print(f"✅ Model dan index dimuat ({len(engine.retriever.store)} passage)")
+
+    # === 3. MENJALANKAN SERVER === #
+    threads = threads_per_worker(args.workers, args.threads)
+    if prefork:
+        run_workers(engine, args.workers, args.host, args.port, args.max_batch_size, args.max_wait_ms, threads)
+    else:
+        set_worker_threads(threads)
+        web.run_app(
+            create_app(engine, args.max_batch_size, args.max_wait_ms),
+            host=args.host,
+            port=args.port
+        )
@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from bench_index import INDEX_TYPES, build
+from utils.retriever import MIN_PQ_NBITS, PQ_M, apply_search_params, create_index
+
+
+def make_corpus(num_vectors, dim=PQ_M * 4, seed=0):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((num_vectors, dim)).astype(np.float32)
+    ids = np.arange(num_vectors, dtype=np.int64) * 7
+    return embeddings, ids
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+@pytest.mark.parametrize("num_vectors", [2 ** MIN_PQ_NBITS, 60, 300])
+def test_build_every_index_type_on_small_corpus(index_type, num_vectors):
+    embeddings, ids = make_corpus(num_vectors)
+    index, _ = build(index_type, embeddings, ids)
+    assert index.ntotal == num_vectors
+
+    apply_search_params(index)
+    _, found = index.search(embeddings[:3], 1)
+    assert set(found[:, 0].tolist()) <= set(ids.tolist())
+
+
+def test_ivfpq_rejects_tiny_corpus():
+    with pytest.raises(ValueError, match=str(2 ** MIN_PQ_NBITS)):
+        create_index(PQ_M * 4, "IVFPQ", num_vectors=2 ** MIN_PQ_NBITS - 1)
@@ -1,11 +1,11 @@
 import os
-import json
 import yaml
 import evaluate
-from datasets import Dataset, DatasetDict
-from transformers import AutoTokenizer, AutoModelForQuestionAnswering, TrainingArguments, Trainer
-from utils.preprocess import preprocess_training_examples, preprocess_validation_examples
+from datasets import DatasetDict
+from transformers import AutoTokenizer, AutoModelForQuestionAnswering, TrainingArguments, Trainer, DataCollatorWithPadding
+from utils.preprocess import preprocess_training_examples, preprocess_validation_examples, load_features, DYNAMIC_PADDING
 from utils.metric import compute_metrics
+from utils.passages import load_squad_data
 
 # === 1. MEMUAT KONFIGURASI DARI YAML === #
 with open('cfg/config.yaml', 'r', encoding='utf-8') as file:
@@ -17,39 +17,11 @@ STRIDE = config["Config"]["STRIDE"]
 TRAIN_FILE = config["Config"]["DATASET_NAME"]            # misal: "data/train.json"
 VAL_FILE = config["Config"]["VALIDATION_DATASET_NAME"]     # misal: "data/validation.json"
 FINETUNED_MODEL_NAME = config["Config"]["FINETUNED_MODEL_NAME"]
+# Sampler yang mengelompokkan feature dengan panjang mirip dalam satu batch
+# (hanya berguna bersama DYNAMIC_PADDING, karena padding dilakukan per batch)
+GROUP_BY_LENGTH = config["Config"].get("GROUP_BY_LENGTH", True) and DYNAMIC_PADDING
 
-# === 2. FUNGSI UNTUK MEMUAT DATASET SQUAD DARI FILE LOKAL === #
-def load_squad_data(file_path):
-    with open(file_path, "r", encoding="utf-8") as f:
-        squad_dict = json.load(f)
-    
-    contexts, questions, answers, ids = [], [], [], []
-    for article in squad_dict["data"]:
-        for paragraph in article["paragraphs"]:
-            context = paragraph["context"]
-            for qa in paragraph["qas"]:
-                question = qa["question"]
-                id_ = qa["id"]
-                if "answers" not in qa or not qa["answers"]:
-                    answer = {"text": [""], "answer_start": [0]}
-                else:
-                    answer = {
-                        "text": [qa["answers"][0]["text"]],
-                        "answer_start": [qa["answers"][0]["answer_start"]]
-                    }
-                contexts.append(context)
-                questions.append(question)
-                ids.append(id_)
-                answers.append(answer)
-    
-    return Dataset.from_dict({
-        "id": ids,
-        "context": contexts,
-        "question": questions,
-        "answers": answers
-    })
-
-# === 3. MEMUAT DATASET TRAIN DAN VALIDASI === #
+# === 2. MEMUAT DATASET TRAIN DAN VALIDASI === #
 train_dataset = load_squad_data(TRAIN_FILE)
 validation_dataset = load_squad_data(VAL_FILE)
 
@@ -63,28 +35,21 @@ os.makedirs(FINETUNED_MODEL_NAME, exist_ok=True)
 raw_datasets.save_to_disk(os.path.join(FINETUNED_MODEL_NAME, "raw_dataset"))
 print("✅ Raw dataset berhasil disimpan.")
 
-# === 4. MEMUAT TOKENIZER DAN MODEL === #
+# === 3. MEMUAT TOKENIZER DAN MODEL === #
 tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
 model = AutoModelForQuestionAnswering.from_pretrained(MODEL_NAME)
 
-# === 5. PREPROCESSING DATASET === #
-train_dataset = train_dataset.map(
-    preprocess_training_examples,
-    batched=True,
-    remove_columns=train_dataset.column_names
-)
-
-validation_dataset = validation_dataset.map(
-    preprocess_validation_examples,
-    batched=True,
-    remove_columns=validation_dataset.column_names
-)
+# === 4. PREPROCESSING DATASET === #
+# Feature hasil tokenisasi di-cache di FEATURE_CACHE_DIR; run berikutnya (misalnya
+# sweep hyperparameter) memuatnya dari disk tanpa tokenisasi ulang
+train_dataset = load_features(train_dataset, preprocess_training_examples, TRAIN_FILE)
+validation_dataset = load_features(validation_dataset, preprocess_validation_examples, VAL_FILE)
 
 # Validasi bahwa kolom-kolom penting sudah ada setelah preprocessing
 if "input_ids" not in train_dataset.column_names:
     raise ValueError("❌ Kolom 'input_ids' hilang setelah preprocessing! Periksa kembali fungsi preprocessing.")
 
-# === 6. KONFIGURASI TRAINING === #
+# === 5. KONFIGURASI TRAINING === #
 args = TrainingArguments(
     output_dir=FINETUNED_MODEL_NAME,
     evaluation_strategy="no",        # atau "epoch" jika ingin evaluasi setiap epoch
@@ -94,20 +59,27 @@ args = TrainingArguments(
     weight_decay=0.01,
     fp16=True,
     push_to_hub=False,
+    group_by_length=GROUP_BY_LENGTH,
+    length_column_name="length",
 )
 
+# Dengan DYNAMIC_PADDING, feature dipadding ke panjang terpanjang di setiap batch.
+# Logit hasil predict() antar batch disamakan panjangnya oleh Trainer (diisi -100)
+data_collator = DataCollatorWithPadding(tokenizer)
+
 trainer = Trainer(
     model=model,
     args=args,
     train_dataset=train_dataset,
     eval_dataset=validation_dataset,
     tokenizer=tokenizer,
+    data_collator=data_collator,
 )
 
-# === 7. TRAINING MODEL === #
+# === 6. TRAINING MODEL === #
 trainer.train()
 
-# === 8. EVALUASI MODEL === #
+# === 7. EVALUASI MODEL === #
 metric = evaluate.load("squad_v2")
 predictions = trainer.predict(validation_dataset)
 if isinstance(predictions.predictions, tuple):
@@ -118,7 +90,7 @@ else:
 results = compute_metrics(start_logits, end_logits, validation_dataset, raw_datasets["validation"])
 print("🔎 Evaluation Results:", results)
 
-# === 9. MENYIMPAN DATASET, MODEL, DAN TOKENIZER === #
+# === 8. MENYIMPAN DATASET, MODEL, DAN TOKENIZER === #
 # Jika ingin menambahkan kembali kolom 'question', pastikan jumlahnya sesuai dengan dataset hasil preprocessing.
 # Berikut contoh menambahkan kolom 'question' dengan menduplikasi nilai sesuai mapping overflow.
 # Jika tidak diperlukan, bagian ini dapat dihilangkan.
@@ -0,0 +1,105 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    Cache LRU yang thread-safe, dibatasi jumlah entri dan (opsional) total ukuran byte
+    nilai (atribut `nbytes`, misalnya array NumPy) serta umur entri (ttl, detik).
+    Satu instance di level modul dipakai bersama oleh semua sesi Streamlit dalam satu proses.
+    """
+
+    def __init__(self, max_entries, max_bytes=None, ttl=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _sizeof(value):
+        return getattr(value, "nbytes", 0)
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                value, expires_at = self._data[key]
+                if expires_at is None or time.monotonic() < expires_at:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+                self._bytes -= self._sizeof(value)
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        if self.max_entries <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._data:
+                self._bytes -= self._sizeof(self._data.pop(key)[0])
+            self._data[key] = (value, expires_at)
+            self._bytes += self._sizeof(value)
+            while self._data and (
+                len(self._data) > self.max_entries
+                or (self.max_bytes is not None and self._bytes > self.max_bytes)
+            ):
+                _, (evicted, _) = self._data.popitem(last=False)
+                self._bytes -= self._sizeof(evicted)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Statistik cache: hits, misses, hit_rate, evictions, expirations, entries, bytes."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+            }
+
+
+def file_fingerprint(*paths):
+    """
+    Sidik jari versi dari sekumpulan file/direktori (path, mtime, ukuran). Berubah setiap
+    kali index atau model dibangun ulang, sehingga bisa dipakai sebagai bagian kunci cache.
+    Untuk direktori hanya file di level teratas yang diperiksa; path yang tidak ada
+    (misalnya nama model di Hugging Face Hub) ikut di-hash sebagai teks.
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(str(path).encode("utf-8"))
+        if os.path.isdir(path):
+            entries = sorted(
+                (entry.name, entry.stat()) for entry in os.scandir(path) if entry.is_file()
+            )
+        elif os.path.exists(path):
+            entries = [("", os.stat(path))]
+        else:
+            entries = []
+        for name, stat in entries:
+            digest.update(f"{name}:{stat.st_mtime_ns}:{stat.st_size}".encode("utf-8"))
+    return digest.hexdigest()[:12]
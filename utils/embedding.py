@@ -1,7 +1,14 @@
+import copy
+import re
+import unicodedata
+import numpy as np
 import torch
-from sentence_transformers import SentenceTransformer
 import yaml
 
+from utils.cache import LRUCache
+from utils.lazy import LazyResource
+from utils.telemetry import register_cache, stage_timer
+
 device = torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu")
 
 # Muat konfigurasi dari file YAML
@@ -14,8 +21,134 @@ with open('cfg/config.yaml', 'r', encoding='utf-8') as file:
 #   SBERT_MODEL_NAME: "sentence-transformers/all-MiniLM-L6-v2"
 MODEL_NAME = config["Config"].get("SBERT_MODEL_NAME", "sentence-transformers/all-MiniLM-L6-v2")
 
-# Inisialisasi model Sentence-BERT
-model = SentenceTransformer(MODEL_NAME, device=device)
+# Batas cache embedding pertanyaan (jumlah entri dan total byte vektor)
+QUERY_CACHE_SIZE = config["Config"].get("QUERY_CACHE_SIZE", 10000)
+QUERY_CACHE_MAX_BYTES = config["Config"].get("QUERY_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+
+# Backend encoder: "torch" (default), "int8" (kuantisasi dinamis PyTorch, CPU),
+# atau "onnx" (ONNX Runtime, file dari export_encoder.py)
+SBERT_BACKEND = config["Config"].get("SBERT_BACKEND", "torch")
+SBERT_ONNX_PATH = config["Config"].get("SBERT_ONNX_PATH", "sbert-onnx/model.onnx")
+
+
+class TorchSentenceEncoder:
+    """Encoder SentenceTransformer biasa (atau hasil kuantisasi dinamis)."""
+
+    def __init__(self, st_model):
+        self.model = st_model
+
+    def encode(self, text_list, batch_size=32):
+        embeddings = self.model.encode(
+            text_list,
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
+        return embeddings.astype(np.float32, copy=False)
+
+
+class OnnxSentenceEncoder:
+    """
+    Menjalankan modul Transformer dari SentenceTransformer lewat ONNX Runtime, lalu
+    melakukan pooling (dan normalisasi, jika ada di model) dengan NumPy.
+    """
+
+    def __init__(self, st_model, path):
+        # onnxruntime hanya dibutuhkan jika backend ONNX dipilih
+        import onnxruntime as ort
+        from sentence_transformers import models
+
+        self.tokenizer = st_model.tokenizer
+        self.max_seq_length = st_model.max_seq_length
+        pooling = [module for module in st_model if isinstance(module, models.Pooling)][0]
+        self.pooling_mode = pooling.get_pooling_mode_str()
+        if self.pooling_mode not in ("mean", "cls", "max"):
+            raise ValueError(f"Pooling '{self.pooling_mode}' belum didukung backend ONNX")
+        self.normalize = any(isinstance(module, models.Normalize) for module in st_model)
+        self.session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    def encode(self, text_list, batch_size=32):
+        outputs = []
+        for start in range(0, len(text_list), batch_size):
+            encodings = self.tokenizer(
+                text_list[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            hidden = self.session.run(
+                ["last_hidden_state"],
+                {name: encodings[name].astype(np.int64) for name in self.input_names}
+            )[0]
+            mask = encodings["attention_mask"][..., None].astype(np.float32)
+            if self.pooling_mode == "mean":
+                emb = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            elif self.pooling_mode == "cls":
+                emb = hidden[:, 0]
+            else:
+                emb = np.where(mask > 0, hidden, -1e9).max(axis=1)
+            if self.normalize:
+                emb = emb / np.clip(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12, None)
+            outputs.append(emb.astype(np.float32))
+        return np.concatenate(outputs)
+
+
+def load_encoder(backend=SBERT_BACKEND, st_model=None, onnx_path=SBERT_ONNX_PATH):
+    """
+    Membuat encoder sesuai backend. st_model (SentenceTransformer) dipakai ulang jika
+    diberikan; backend "int8" bekerja pada salinannya sehingga model asli tidak berubah.
+    onnx_path hanya dipakai backend "onnx".
+    """
+    st_model = st_model if st_model is not None else get_model()
+    if backend == "torch":
+        return TorchSentenceEncoder(st_model)
+    if backend == "int8":
+        quantized = torch.quantization.quantize_dynamic(
+            copy.deepcopy(st_model).to("cpu"), {torch.nn.Linear}, dtype=torch.qint8
+        )
+        return TorchSentenceEncoder(quantized)
+    if backend == "onnx":
+        return OnnxSentenceEncoder(st_model, onnx_path)
+    raise ValueError(f"SBERT_BACKEND tidak dikenal: {backend}")
+
+
+def _load_sbert_model():
+    # sentence_transformers (beserta transformers) diimpor saat model pertama kali dibutuhkan
+    from sentence_transformers import SentenceTransformer
+
+    return SentenceTransformer(MODEL_NAME, device=device)
+
+
+# Model Sentence-BERT dan encoder sesuai backend dimuat saat pertama kali dipakai
+sbert_model = LazyResource("sbert.model", _load_sbert_model)
+sbert_encoder = LazyResource("sbert.encoder", lambda: load_encoder(SBERT_BACKEND, get_model()))
+
+
+def get_model():
+    """SentenceTransformer (dimuat saat pertama kali dipanggil)."""
+    return sbert_model.get()
+
+
+def get_encoder():
+    """Encoder sesuai SBERT_BACKEND (dimuat saat pertama kali dipanggil)."""
+    return sbert_encoder.get()
+
+
+def reload_encoder():
+    """
+    Membuang encoder ONNX agar get_encoder() berikutnya membuat sesi baru dari model
+    yang sudah dimuat. Dipanggil di proses worker
+    setelah fork: sesi ONNX Runtime (beserta thread pool-nya) tidak bisa dipakai
+    ulang dari proses induk, sedangkan bobot PyTorch cukup dibagi copy-on-write.
+    """
+    if SBERT_BACKEND == "onnx":
+        sbert_encoder.reset()
+
+# Cache embedding pertanyaan, dipakai bersama oleh semua sesi dalam satu proses
+query_cache = LRUCache(QUERY_CACHE_SIZE, max_bytes=QUERY_CACHE_MAX_BYTES)
+register_cache("query_embedding", query_cache)
 
 def get_embeddings(text_list):
     """
@@ -26,7 +159,58 @@ def get_embeddings(text_list):
     if isinstance(text_list, str):
         text_list = [text_list]
 
-    # Encode teks menggunakan Sentence-BERT
-    embeddings = model.encode(text_list, convert_to_tensor=True, show_progress_bar=False)
+    # Encode teks menggunakan Sentence-BERT (backend sesuai SBERT_BACKEND)
+    embeddings = torch.from_numpy(get_encoder().encode(text_list))
     # embeddings akan berupa torch.Tensor dengan shape [batch_size, emb_dim]
     return embeddings
+
+def encode_passages(text_list, batch_size=64):
+    """
+    Meng-encode satu batch passage sekaligus untuk membangun FAISS index.
+    :param text_list: list of strings
+    :param batch_size: ukuran batch untuk encoder
+    :return: np.ndarray float32 shape (len(text_list), embedding_dim)
+    """
+    return get_encoder().encode(text_list, batch_size=batch_size)
+
+def get_embedding_dim():
+    """Dimensi vektor embedding dari model Sentence-BERT yang dipakai."""
+    return get_model().get_sentence_embedding_dimension()
+
+def normalize_question(question):
+    """
+    Bentuk normal pertanyaan untuk kunci cache: huruf kecil, tanda baca dihapus,
+    spasi dirapikan. "Gejala  demam berdarah?" dan "gejala demam berdarah" sama.
+    """
+    question = unicodedata.normalize("NFKC", question).lower()
+    question = "".join(" " if unicodedata.category(ch).startswith("P") else ch for ch in question)
+    return re.sub(r"\s+", " ", question).strip()
+
+def get_query_embeddings(questions):
+    """
+    Embedding pertanyaan untuk pencarian FAISS, melalui cache LRU: pertanyaan yang
+    belum ada di cache di-encode bersama dalam satu panggilan encoder.
+    Bentuk normal hanya dipakai sebagai kunci cache; yang di-encode adalah teks asli
+    pertanyaan (kemunculan pertama untuk setiap kunci).
+    :return: np.ndarray float32 shape (len(questions), embedding_dim)
+    """
+    keys = [normalize_question(q) for q in questions]
+    embeddings = {}
+    with stage_timer("query_cache", items=len(keys)):
+        for key in keys:
+            cached = query_cache.get(key)
+            if cached is not None:
+                embeddings[key] = cached
+    missing = {}
+    for key, question in zip(keys, questions):
+        if key not in embeddings:
+            missing.setdefault(key, question)
+    if missing:
+        with stage_timer("encoder", items=len(missing)):
+            missing_embeddings = encode_passages(list(missing.values()))
+        for key, embedding in zip(missing, missing_embeddings):
+            embedding = embedding[None, :].copy()
+            embedding.setflags(write=False)
+            query_cache.put(key, embedding)
+            embeddings[key] = embedding
+    return np.vstack([embeddings[key] for key in keys])
@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Waktu muat setiap resource/tahap startup (detik) di proses ini, sesuai urutan pemuatan
+_timings = OrderedDict()
+_timings_lock = threading.Lock()
+
+
+def record_timing(name, seconds):
+    with _timings_lock:
+        _timings[name] = seconds
+    print(f"[startup] {name}: {seconds:.2f}s")
+
+
+@contextmanager
+def timed(name):
+    """Mencatat lama blok kode ke rincian waktu startup."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(name, time.perf_counter() - start)
+
+
+def startup_timings():
+    """Rincian waktu startup: dict nama -> detik, sesuai urutan pemuatan."""
+    with _timings_lock:
+        return dict(_timings)
+
+
+class LazyResource:
+    """
+    Resource berat (model, metric) yang baru dimuat saat get() pertama kali dipanggil.
+    Aman dipanggil bersamaan dari beberapa thread (misalnya thread warmup dan sesi
+    Streamlit): loader hanya dijalankan sekali, pemanggil lain menunggu hasilnya.
+    Jika get() dipanggil dengan versi yang berbeda (misalnya setelah index atau model
+    dibangun ulang), resource dimuat ulang.
+    """
+
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        # (versi, resource) diganti sekaligus dalam satu assignment, sehingga pembaca
+        # tanpa lock selalu melihat pasangan yang utuh; None = belum dimuat
+        self._state = None
+        self._lock = threading.Lock()
+
+    def get(self, version=None):
+        state = self._state
+        if state is None or state[0] != version:
+            with self._lock:
+                state = self._state
+                if state is None or state[0] != version:
+                    # Versi lama tetap dilayani ke sesi lain sampai versi baru selesai dimuat
+                    with timed(self.name):
+                        state = (version, self.loader())
+                    self._state = state
+        return state[1]
+
+    def reset(self):
+        """Membuang resource yang sudah dimuat; get() berikutnya memuat ulang."""
+        with self._lock:
+            self._state = None
+
+
+def warmup(*loaders, name="warmup"):
+    """
+    Menjalankan fungsi pemuat (misalnya LazyResource.get) di thread latar agar
+    resource sudah siap ketika dipakai pertama kali, tanpa menahan startup.
+    :return: threading.Thread yang sudah dijalankan
+    """
+    def run():
+        with timed(name):
+            for loader in loaders:
+                try:
+                    loader()
+                except Exception as exc:
+                    # Gagal di warmup tidak fatal: resource dicoba lagi saat dipakai
+                    print(f"[startup] {name}: gagal memuat ({exc})")
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
@@ -1,78 +1,168 @@
-from tqdm.auto import tqdm
 import collections
-import evaluate
 import numpy as np
+import pyarrow as pa
 
-metric = evaluate.load("squad_v2")
+from utils.lazy import LazyResource
+
+
+def _load_squad_v2_metric():
+    # evaluate diimpor di sini; memuat metric butuh akses ke Hugging Face Hub
+    import evaluate
+
+    return evaluate.load("squad_v2")
+
+
+# Metric squad_v2 dimuat saat compute_metrics pertama kali dipanggil, bukan saat import
+metric = LazyResource("metric.squad_v2", _load_squad_v2_metric)
 
 
 N_BEST = 20  # Number of top results chosen after prediction
 MAX_ANS_LENGTH = 30  # Maximum length for the predicted answer
 
-def compute_metrics(start_logits, end_logits, features, examples):
+
+def _column(dataset, name):
+    """Satu kolom utuh sekaligus (bukan per baris); pyarrow untuk datasets.Dataset."""
+    if hasattr(dataset, "with_format"):
+        return dataset.with_format("arrow")[name]
+    return dataset[name]
+
+
+def offset_arrays(offset_mapping, seq_len):
+    """
+    Mengubah kolom offset_mapping (per token [start_char, end_char] atau None untuk
+    token di luar context) menjadi array NumPy shape (num_features, seq_len):
+    char_start, char_end, dan mask valid. Token di luar seq_len diabaikan, token
+    yang tidak ada (padding dinamis) dianggap tidak valid.
+    """
+    if isinstance(offset_mapping, pa.ChunkedArray):
+        offset_mapping = offset_mapping.combine_chunks()
+    if not isinstance(offset_mapping, pa.Array):
+        offset_mapping = pa.array(offset_mapping, type=pa.list_(pa.list_(pa.int64())))
+
+    num_features = len(offset_mapping)
+    lengths = offset_mapping.value_lengths().fill_null(0).to_numpy(zero_copy_only=False)
+    tokens = offset_mapping.flatten()
+    valid_flat = tokens.is_valid().to_numpy(zero_copy_only=False)
+    # flatten() melewati token None, sehingga tersisa pasangan (start, end) token valid
+    pairs = tokens.flatten().to_numpy(zero_copy_only=False).astype(np.int64).reshape(-1, 2)
+
+    rows = np.repeat(np.arange(num_features), lengths)
+    cols = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    keep = cols < seq_len
+
+    char_start = np.zeros((num_features, seq_len), dtype=np.int64)
+    char_end = np.zeros((num_features, seq_len), dtype=np.int64)
+    valid = np.zeros((num_features, seq_len), dtype=bool)
+    valid_rows, valid_cols = rows[valid_flat & keep], cols[valid_flat & keep]
+    pairs = pairs[keep[valid_flat]]
+    char_start[valid_rows, valid_cols] = pairs[:, 0]
+    char_end[valid_rows, valid_cols] = pairs[:, 1]
+    valid[valid_rows, valid_cols] = True
+    return char_start, char_end, valid
+
+
+def token_lengths(features):
+    """
+    Jumlah token asli (tanpa padding) setiap feature dari kolom attention_mask,
+    atau None jika kolom tersebut tidak ada.
+    """
+    if "attention_mask" not in getattr(features, "column_names", features):
+        return None
+    attention_mask = _column(features, "attention_mask")
+    if isinstance(attention_mask, pa.ChunkedArray):
+        attention_mask = attention_mask.combine_chunks()
+    if not isinstance(attention_mask, pa.Array):
+        attention_mask = pa.array(attention_mask, type=pa.list_(pa.int64()))
+    lengths = attention_mask.value_lengths().fill_null(0).to_numpy(zero_copy_only=False)
+    values = attention_mask.flatten().to_numpy(zero_copy_only=False).astype(np.int64)
+    row_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+    sums = np.add.reduceat(values, row_starts) if len(values) else np.zeros(len(lengths), dtype=np.int64)
+    # reduceat pada baris kosong mengambil nilai baris berikutnya
+    return np.where(lengths > 0, sums, 0)
+
+
+def best_spans(start_logits, end_logits, valid, n_best=N_BEST, max_answer_length=MAX_ANS_LENGTH):
+    """
+    Span terbaik setiap feature dari kombinasi n_best start x n_best end, untuk semua
+    feature sekaligus: outer sum logit start + end, lalu span dengan token di luar
+    context atau panjang > max_answer_length di-mask. Urutan kandidat sama dengan
+    loop start lalu end, sehingga skor seri memilih kandidat yang sama.
+    :return: tuple (start_index, end_index, logit_score, has_answer), masing-masing shape (num_features,)
+    """
+    rows = np.arange(len(start_logits))[:, None]
+    start_indexes = np.argsort(start_logits, axis=1)[:, -1: -n_best - 1: -1]
+    end_indexes = np.argsort(end_logits, axis=1)[:, -1: -n_best - 1: -1]
+
+    scores = start_logits[rows, start_indexes][:, :, None] + end_logits[rows, end_indexes][:, None, :]
+    mask = (
+        valid[rows, start_indexes][:, :, None]
+        & valid[rows, end_indexes][:, None, :]
+        & (end_indexes[:, None, :] - start_indexes[:, :, None] + 1 <= max_answer_length)
+    )
+    scores = np.where(mask, scores, -np.inf)
+
+    flat = scores.reshape(len(scores), -1)
+    best = flat.argmax(axis=1)
+    best_start = start_indexes[rows[:, 0], best // end_indexes.shape[1]]
+    best_end = end_indexes[rows[:, 0], best % end_indexes.shape[1]]
+    return best_start, best_end, flat[rows[:, 0], best], mask.reshape(len(mask), -1).any(axis=1)
+
+
+def postprocess_predictions(start_logits, end_logits, features, examples):
+    """
+    :return: list prediksi {"id", "prediction_text", "no_answer_probability"} per contoh,
+             jawaban dengan logit tertinggi di antara semua feature contoh tersebut
+    """
+    start_logits = np.asarray(start_logits)
+    end_logits = np.asarray(end_logits)
+    lengths = token_lengths(features)
+    if lengths is not None:
+        # Token padding (padding="max_length" atau padding per batch) tidak ikut
+        # bersaing di n-best, sehingga hasil sama untuk kedua mode padding
+        padding = np.arange(start_logits.shape[1])[None, :] >= lengths[:, None]
+        start_logits = np.where(padding, -np.inf, start_logits)
+        end_logits = np.where(padding, -np.inf, end_logits)
+    char_start, char_end, valid = offset_arrays(_column(features, "offset_mapping"), start_logits.shape[1])
+    span_start, span_end, span_scores, has_answer = best_spans(start_logits, end_logits, valid)
+
     # Create a default dictionary to map each example to a list of corresponding features
     example_to_features = collections.defaultdict(list)
-    for idx, feature in enumerate(features):
-        example_to_features[features[idx]["example_id"]].append(idx)
-    
+    for idx, example_id in enumerate(features["example_id"]):
+        example_to_features[example_id].append(idx)
+
     predicted_answers = []
-    for example in tqdm(examples):
-        example_id = example["id"]
-        context = example["context"]
-        answers = []
-        
-        # Loop through all features related to that example
+    for example_id, context in zip(examples["id"], examples["context"]):
+        best = None
         for feature_index in example_to_features[example_id]:
-            start_logit = start_logits[feature_index]
-            end_logit = end_logits[feature_index]
-            offsets = features[feature_index]['offset_mapping']
-            
-            # Get the indices with the highest values for start and end logits
-            start_indexes = np.argsort(start_logit)[-1: -N_BEST - 1: -1].tolist()
-            end_indexes = np.argsort(end_logit)[-1: -N_BEST - 1: -1].tolist()
-            
-            for start_index in start_indexes:
-                for end_index in end_indexes:
-                    # Skip answers that are not completely within the context
-                    if offsets[start_index] is None or offsets[end_index] is None:
-                        continue
-                    
-                    # Skip answers with a length > max_answer_length
-                    if end_index - start_index + 1 > MAX_ANS_LENGTH:
-                        continue
-                    
-                    # Create a new answer
-                    text = context[offsets[start_index][0]:offsets[end_index][1]]
-                    
-                    logit_score = start_logit[start_index] + end_logit[end_index]
-                    
-                    answer = {
-                        "text": text,
-                        "logit_score": logit_score
-                    }
-                    answers.append(answer)
-                    
-        if len(answers) > 0:
-            best_answer = max(answers, key=lambda x: x["logit_score"])
-            answer_dict = {
+            if has_answer[feature_index] and (best is None or span_scores[feature_index] > span_scores[best]):
+                best = feature_index
+
+        if best is not None:
+            text = context[char_start[best, span_start[best]]:char_end[best, span_end[best]]]
+            predicted_answers.append({
                 "id": example_id,
-                "prediction_text": best_answer["text"],
-                "no_answer_probability": 1 - best_answer["logit_score"]
-            }
+                "prediction_text": text,
+                "no_answer_probability": 1 - span_scores[best]
+            })
         else:
-            answer_dict = {
+            predicted_answers.append({
                 "id": example_id,
                 "prediction_text": "",
                 "no_answer_probability": 1.0
-            }
-        predicted_answers.append(answer_dict)
-    
+            })
+    return predicted_answers
+
+
+def compute_metrics(start_logits, end_logits, features, examples):
+    predicted_answers = postprocess_predictions(start_logits, end_logits, features, examples)
+
     # Create a list of theoretical answers from the examples
     theoretical_answers = [
-        {'id': ex['id'], 'answers': ex['answers']} for ex in examples
+        {"id": example_id, "answers": answers}
+        for example_id, answers in zip(examples["id"], examples["answers"])
     ]
-    
-    return metric.compute(
+
+    return metric.get().compute(
         predictions=predicted_answers,
         references=theoretical_answers
-    )
\ No newline at end of file
+    )
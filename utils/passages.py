@@ -0,0 +1,261 @@
+import csv
+import hashlib
+import json
+import os
+
+import numpy as np
+import pyarrow as pa
+
+# Lokasi penyimpanan passage (Arrow IPC, bisa di-mmap) yang menjadi pasangan FAISS index
+PASSAGE_STORE_PATH = os.path.join("faiss_index", "passages.arrow")
+
+
+def passage_hash(context):
+    """
+    Menghasilkan id passage dari isi teksnya (SHA-1, 16 karakter hex pertama).
+    Paragraf yang sama persis akan selalu mendapat id yang sama.
+    """
+    return hashlib.sha1(context.encode("utf-8")).hexdigest()[:16]
+
+
+def passage_faiss_id(passage_id):
+    """
+    Id int64 (positif) untuk vektor passage di FAISS index ber-IDMap, diturunkan dari
+    id passage sehingga tetap sama di antara build penuh dan build inkremental.
+    """
+    return int(hashlib.sha1(passage_id.encode("utf-8")).hexdigest()[:15], 16)
+
+
+def iter_squad_qas(file_path):
+    """
+    Satu-satunya parser file JSON berformat SQuAD yang dipakai trainer.py, faiss_index.py,
+    dan aplikasi.
+    :return: generator tuple (judul artikel, context, qa dict)
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        squad_dict = json.load(f)
+
+    for article in squad_dict["data"]:
+        title = article.get("title", "")
+        for paragraph in article["paragraphs"]:
+            for qa in paragraph["qas"]:
+                yield title, paragraph["context"], qa
+
+
+def load_squad_data(file_path):
+    """
+    Membaca file JSON berformat SQuAD dan mengonversinya ke Dataset Hugging Face.
+    Menghasilkan kolom: [id, context, question, answers].
+    """
+    # Diimpor di sini agar aplikasi (yang hanya butuh passage store) tidak memuat datasets
+    from datasets import Dataset
+
+    contexts, questions, answers, ids = [], [], [], []
+    for _, context, qa in iter_squad_qas(file_path):
+        if "answers" not in qa or not qa["answers"]:
+            answer = {"text": [""], "answer_start": [0]}
+        else:
+            answer = {
+                "text": [qa["answers"][0]["text"]],
+                "answer_start": [qa["answers"][0]["answer_start"]]
+            }
+        contexts.append(context)
+        questions.append(qa["question"])
+        ids.append(qa["id"])
+        answers.append(answer)
+
+    return Dataset.from_dict({
+        "id": ids,
+        "context": contexts,
+        "question": questions,
+        "answers": answers
+    })
+
+
+def iter_question_file(path, question_field="question", id_field="id"):
+    """
+    Membaca pertanyaan satu per satu dari file JSONL (satu objek JSON per baris) atau
+    CSV (dengan header). Baris tanpa id diberi nomor urut baris.
+    :return: generator dict {"id", "question"}
+    """
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if path.endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+        for line_no, row in enumerate(rows):
+            question = (row.get(question_field) or "").strip()
+            if question:
+                yield {"id": row.get(id_field, line_no), "question": question}
+
+
+def iter_squad_passages(file_path, dedup=True):
+    """
+    Membaca file JSON berformat SQuAD dan menghasilkan passage satu per satu.
+    :param file_path: path file SQuAD (misal: "data/train.json")
+    :param dedup: True -> satu passage per paragraf unik (dikunci dengan hash isi),
+                  False -> satu passage per baris pertanyaan (perilaku lama)
+    :return: generator dict {"id", "context", "titles", "question_ids"} sesuai urutan kemunculan
+    """
+    if not dedup:
+        for title, context, qa in iter_squad_qas(file_path):
+            yield {
+                "id": qa["id"],
+                "context": context,
+                "titles": [title],
+                "question_ids": [qa["id"]]
+            }
+        return
+
+    # Paragraf yang sama bisa muncul di beberapa artikel, jadi judul dan id pertanyaan
+    # dikumpulkan dulu sebelum passage dikeluarkan
+    by_id = {}
+    for title, context, qa in iter_squad_qas(file_path):
+        pid = passage_hash(context)
+        if pid not in by_id:
+            by_id[pid] = {"id": pid, "context": context, "titles": [], "question_ids": []}
+        passage = by_id[pid]
+        if title not in passage["titles"]:
+            passage["titles"].append(title)
+        passage["question_ids"].append(qa["id"])
+    yield from by_id.values()
+
+
+def load_squad_passages(file_path, dedup=True):
+    """Versi list dari iter_squad_passages."""
+    return list(iter_squad_passages(file_path, dedup=dedup))
+
+
+def iter_length_sorted_batches(passages, batch_size, window_batches=16):
+    """
+    Mengelompokkan aliran passage menjadi batch berukuran batch_size. Setiap jendela
+    berisi window_batches batch diurutkan berdasarkan panjang context terlebih dahulu,
+    sehingga padding di dalam satu batch tetap kecil tanpa memuat semua passage sekaligus.
+    """
+    window = []
+    window_size = batch_size * window_batches
+
+    def flush(items):
+        items.sort(key=lambda p: len(p["context"]))
+        for start in range(0, len(items), batch_size):
+            yield items[start:start + batch_size]
+
+    for passage in passages:
+        window.append(passage)
+        if len(window) >= window_size:
+            yield from flush(window)
+            window = []
+    if window:
+        yield from flush(window)
+
+
+class PassageStore:
+    """
+    Passage store berbasis tabel Arrow. File disimpan dalam format Arrow IPC sehingga
+    saat aplikasi dimulai cukup di-mmap, tanpa parsing JSON.
+    Kolom: id, faiss_id, context, titles, question_ids, dan opsional token_ids,
+    token_offsets (token context untuk tokenizer reader, sidik jari tokenizer di metadata
+    skema "reader_tokenizer").
+    """
+
+    COLUMNS = ["id", "context", "titles", "question_ids"]
+
+    def __init__(self, table):
+        self.table = table
+        self.faiss_ids = table.column("faiss_id").to_numpy()
+        self._id_order = np.argsort(self.faiss_ids, kind="stable")
+        self._sorted_ids = self.faiss_ids[self._id_order]
+        metadata = table.schema.metadata or {}
+        fingerprint = metadata.get(b"reader_tokenizer")
+        self.tokenizer_fingerprint = (
+            fingerprint.decode("utf-8") if fingerprint and "token_ids" in table.column_names else None
+        )
+
+    @classmethod
+    def from_passages(cls, passages, context_tokens=None, tokenizer_fingerprint=None):
+        """
+        :param context_tokens: list tuple (token_ids, offsets [n, 2]) per passage dari
+                               utils.reader.tokenize_passages (opsional)
+        :param tokenizer_fingerprint: sidik jari tokenizer yang menghasilkan context_tokens
+        """
+        columns = {
+            "id": pa.array([p["id"] for p in passages], pa.string()),
+            "faiss_id": pa.array([passage_faiss_id(p["id"]) for p in passages], pa.int64()),
+            "context": pa.array([p["context"] for p in passages], pa.string()),
+            "titles": pa.array([p["titles"] for p in passages], pa.list_(pa.string())),
+            "question_ids": pa.array([p["question_ids"] for p in passages], pa.list_(pa.string()))
+        }
+        metadata = None
+        if context_tokens is not None:
+            lengths = np.array([len(ids) for ids, _ in context_tokens], dtype=np.int32)
+            value_offsets = pa.array(np.concatenate([[0], np.cumsum(lengths)]).astype(np.int32))
+            columns["token_ids"] = pa.ListArray.from_arrays(
+                value_offsets, pa.array(np.concatenate([ids for ids, _ in context_tokens] + [np.zeros(0, np.int32)]))
+            )
+            columns["token_offsets"] = pa.ListArray.from_arrays(
+                pa.array(value_offsets.to_numpy() * 2),
+                pa.array(np.concatenate([offsets.ravel() for _, offsets in context_tokens] + [np.zeros(0, np.int32)]))
+            )
+            metadata = {"reader_tokenizer": tokenizer_fingerprint}
+        return cls(pa.table(columns, metadata=metadata))
+
+    @classmethod
+    def load(cls, path=PASSAGE_STORE_PATH):
+        """Memuat passage store secara memory-mapped (tanpa menyalin isi file)."""
+        source = pa.memory_map(path, "r")
+        return cls(pa.ipc.open_file(source).read_all())
+
+    def save(self, path=PASSAGE_STORE_PATH):
+        """
+        Menyimpan store secara atomik (file sementara lalu rename): proses yang sedang
+        me-mmap file lama tetap membaca isi lama, bukan file yang terpotong.
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with pa.OSFile(tmp_path, "wb") as sink:
+            with pa.ipc.new_file(sink, self.table.schema) as writer:
+                writer.write_table(self.table)
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def __getitem__(self, row):
+        return {name: self.table.column(name)[row].as_py() for name in self.COLUMNS}
+
+    def context_tokens(self, passage_ids):
+        """
+        Token context yang disimpan saat build index (zero-copy dari file mmap).
+        :return: list tuple (token_ids int32 [n], offsets int32 [n, 2]) per passage_id,
+                 None untuk passage yang tidak ada di store
+        """
+        rows = self.rows_for_faiss_ids([passage_faiss_id(passage_id) for passage_id in passage_ids])
+        token_ids, token_offsets = self.table.column("token_ids"), self.table.column("token_offsets")
+        results = []
+        for row in rows.tolist():
+            if row < 0:
+                results.append(None)
+                continue
+            results.append((
+                token_ids[row].values.to_numpy(),
+                token_offsets[row].values.to_numpy().reshape(-1, 2),
+            ))
+        return results
+
+    def rows_for_faiss_ids(self, faiss_ids):
+        """Memetakan id vektor FAISS ke nomor baris store (-1 jika tidak ditemukan)."""
+        faiss_ids = np.asarray(faiss_ids, dtype=np.int64)
+        if len(self.faiss_ids) == 0:
+            return np.full(faiss_ids.shape, -1, dtype=np.int64)
+        pos = np.clip(np.searchsorted(self._sorted_ids, faiss_ids), 0, len(self._sorted_ids) - 1)
+        return np.where(self._sorted_ids[pos] == faiss_ids, self._id_order[pos], -1)
+
+
+def load_passage_store(train_file):
+    """
+    Memuat passage store untuk aplikasi: Arrow hasil faiss_index.py, atau jika belum ada,
+    satu passage per baris pertanyaan dari train_file (sesuai index lama yang dibangun per baris).
+    """
+    if os.path.exists(PASSAGE_STORE_PATH):
+        return PassageStore.load(PASSAGE_STORE_PATH)
+    return PassageStore.from_passages(load_squad_passages(train_file, dedup=False))
@@ -1,7 +1,16 @@
+import os
+import shutil
+import hashlib
+from itertools import chain
+
+import numpy as np
 import torch
 from transformers import AutoTokenizer
 import yaml
 
+from utils.cache import file_fingerprint
+from utils.reader import tokenizer_fingerprint
+
 device = torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu")
 
 # Memuat konfigurasi dari file YAML
@@ -11,15 +20,24 @@ with open('cfg/config.yaml', 'r', encoding='utf-8') as file:
 MODEL_NAME = config["Config"]["MODEL_NAME"]
 MAX_LENGTH = config["Config"]["MAX_LENGTH"]
 STRIDE = config["Config"]["STRIDE"]
+# True -> feature disimpan tanpa padding dan dipadding per batch oleh data collator
+# (DataCollatorWithPadding di trainer.py); False -> semua feature dipadding ke MAX_LENGTH
+DYNAMIC_PADDING = config["Config"].get("DYNAMIC_PADDING", True)
+PADDING = False if DYNAMIC_PADDING else "max_length"
+# Feature hasil tokenisasi disimpan di sini dan dipakai ulang selama tokenizer,
+# MAX_LENGTH/STRIDE, mode padding, file data, dan kode preprocessing tidak berubah
+FEATURE_CACHE_DIR = config["Config"].get("FEATURE_CACHE_DIR", "cache/features")
+# Jumlah proses untuk Dataset.map saat tokenisasi (1 = tanpa multiprocessing)
+PREPROCESS_NUM_PROC = config["Config"].get("PREPROCESS_NUM_PROC", 1)
 
 # Inisialisasi tokenizer dari model yang telah ditentukan
 tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
 
-def preprocess_training_examples(examples):
+def _tokenize(examples):
     # Ambil daftar pertanyaan dan hilangkan spasi berlebih
     questions = [q.strip() for q in examples["question"]]
-    
-    inputs = tokenizer(
+
+    return tokenizer(
         questions,
         examples["context"],
         max_length=MAX_LENGTH,
@@ -27,84 +45,139 @@ def preprocess_training_examples(examples):
         stride=STRIDE,
         return_overflowing_tokens=True,
         return_offsets_mapping=True,
-        padding="max_length"
+        padding=PADDING
     )
-    
+
+def _context_spans(inputs, offset_mapping):
+    """
+    Batas context (sequence_id == 1) untuk semua feature sekaligus. Token semua feature
+    digabung menjadi satu array datar (panjang feature boleh berbeda saat padding dinamis).
+    :return: dict array: row_starts, lengths, row (feature tiap token), is_context,
+             offsets (num_tokens, 2), context_start dan context_end (indeks token dalam feature,
+             context_start = panjang feature jika feature tidak punya token context)
+    """
+    num_features = len(offset_mapping)
+    lengths = np.array([len(offsets) for offsets in offset_mapping], dtype=np.int64)
+    row_starts = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+    row = np.repeat(np.arange(num_features), lengths)
+    position = np.arange(len(row)) - row_starts[row]
+
+    num_tokens = int(lengths.sum())
+    # None (token spesial/padding) menjadi -1
+    sequence_ids = np.fromiter(
+        (-1 if s is None else s for s in chain.from_iterable(inputs.sequence_ids(i) for i in range(num_features))),
+        dtype=np.int8, count=num_tokens
+    )
+    is_context = sequence_ids == 1
+    offsets = np.fromiter(
+        chain.from_iterable(chain.from_iterable(offset_mapping)), dtype=np.int64, count=2 * num_tokens
+    ).reshape(-1, 2)
+
+    context_start = np.minimum.reduceat(np.where(is_context, position, lengths[row]), row_starts)
+    context_end = np.maximum.reduceat(np.where(is_context, position, -1), row_starts)
+    return {
+        "row_starts": row_starts, "lengths": lengths, "row": row, "is_context": is_context,
+        "offsets": offsets, "context_start": context_start, "context_end": context_end,
+    }
+
+def preprocess_training_examples(examples):
+    inputs = _tokenize(examples)
+
     # Simpan offset_mapping dan mapping overflow, lalu hapus dari inputs
     offset_mapping = inputs.pop("offset_mapping")
-    sample_map = inputs.pop("overflow_to_sample_mapping")
-    
+    sample_map = np.asarray(inputs.pop("overflow_to_sample_mapping"))
+    spans = _context_spans(inputs, offset_mapping)
+    row, is_context, offsets = spans["row"], spans["is_context"], spans["offsets"]
+    context_start, context_end = spans["context_start"], spans["context_end"]
+    has_context = context_end >= 0
+
+    # Posisi karakter jawaban setiap contoh, lalu disebar ke feature-nya
     answers = examples["answers"]
-    start_positions = []
-    end_positions = []
-    
-    # Iterasi melalui setiap chunk yang dihasilkan oleh tokenizer
-    for i, offset in enumerate(offset_mapping):
-        sample_idx = sample_map[i]
-        sequence_ids = inputs.sequence_ids(i)
-        
-        # Tentukan indeks awal dan akhir konteks (bagian dengan sequence_id == 1)
-        idx = 0
-        while sequence_ids[idx] != 1:
-            idx += 1
-        context_start = idx
-        while idx < len(sequence_ids) and sequence_ids[idx] == 1:
-            idx += 1
-        context_end = idx - 1
-        
-        answer = answers[sample_idx]
-        if len(answer["text"]) == 0:
-            start_positions.append(0)
-            end_positions.append(0)
-        else:
-            start_char = answer["answer_start"][0]
-            end_char = start_char + len(answer["text"][0])
-            
-            # Jika jawaban di luar batas konteks token, set posisi sebagai 0
-            if offset[context_start][0] > start_char or offset[context_end][1] < end_char:
-                start_positions.append(0)
-                end_positions.append(0)
-            else:
-                idx = context_start
-                while idx <= context_end and offset[idx][0] <= start_char:
-                    idx += 1
-                start_positions.append(idx - 1)
-                
-                idx = context_end
-                while idx >= context_start and offset[idx][1] >= end_char:
-                    idx -= 1
-                end_positions.append(idx + 1)
-    
-    inputs["start_positions"] = start_positions
-    inputs["end_positions"] = end_positions
-    
+    has_answer = np.array([len(a["text"]) > 0 for a in answers], dtype=bool)[sample_map]
+    start_char = np.array([a["answer_start"][0] if a["text"] else 0 for a in answers], dtype=np.int64)[sample_map]
+    answer_length = np.array([len(a["text"][0]) if a["text"] else 0 for a in answers], dtype=np.int64)
+    end_char = start_char + answer_length[sample_map]
+
+    # Jika jawaban di luar batas konteks token, posisi = 0 (token CLS)
+    first = spans["row_starts"] + np.where(has_context, context_start, 0)
+    last = spans["row_starts"] + np.where(has_context, context_end, 0)
+    inside = has_context & has_answer & (offsets[first, 0] <= start_char) & (offsets[last, 1] >= end_char)
+
+    # Offset di dalam context terurut naik, sehingga token awal jawaban = token context terakhir
+    # dengan offset awal <= start_char, dan token akhir = token context pertama dengan offset akhir >= end_char
+    count_start = np.add.reduceat((is_context & (offsets[:, 0] <= start_char[row])).astype(np.int64), spans["row_starts"])
+    count_end = np.add.reduceat((is_context & (offsets[:, 1] >= end_char[row])).astype(np.int64), spans["row_starts"])
+    start_positions = np.where(inside, context_start + count_start - 1, 0)
+    end_positions = np.where(inside, context_end - count_end + 1, 0)
+
+    inputs["start_positions"] = start_positions.tolist()
+    inputs["end_positions"] = end_positions.tolist()
+    # Panjang token per feature untuk group_by_length (LengthGroupedSampler) di trainer.py
+    inputs["length"] = spans["lengths"].tolist()
+
     return inputs
 
 def preprocess_validation_examples(examples):
-    # Bersihkan pertanyaan dari spasi berlebih
-    questions = [q.strip() for q in examples["question"]]
-    
-    inputs = tokenizer(
-        questions,
-        examples["context"],
-        max_length=MAX_LENGTH,
-        truncation="only_second",
-        stride=STRIDE,
-        return_overflowing_tokens=True,
-        return_offsets_mapping=True,
-        padding="max_length",
-    )
-    
+    inputs = _tokenize(examples)
+
     sample_map = inputs.pop("overflow_to_sample_mapping")
-    example_ids = []
-    
-    for i in range(len(inputs["input_ids"])):
-        sample_idx = sample_map[i]
-        example_ids.append(examples["id"][sample_idx])
-        
-        sequence_ids = inputs.sequence_ids(i)
-        offset = inputs["offset_mapping"][i]
-        inputs["offset_mapping"][i] = [o if sequence_ids[k] == 1 else None for k, o in enumerate(offset)]
-    
-    inputs["example_id"] = example_ids
+    offset_mapping = inputs["offset_mapping"]
+    spans = _context_spans(inputs, offset_mapping)
+
+    # Context berupa satu rentang token [context_start, context_end]; offset di luarnya
+    # (pertanyaan, token spesial, padding) diganti None dengan slice, bukan per token
+    for i, (start, end) in enumerate(zip(spans["context_start"].tolist(), spans["context_end"].tolist())):
+        offsets = list(offset_mapping[i])
+        if end < start:
+            offsets = [None] * len(offsets)
+        else:
+            offsets[:start] = [None] * start
+            offsets[end + 1:] = [None] * (len(offsets) - end - 1)
+        offset_mapping[i] = offsets
+
+    ids = examples["id"]
+    inputs["example_id"] = [ids[i] for i in sample_map]
     return inputs
+
+def features_fingerprint(data_file, preprocess_fn):
+    """Sidik jari feature: isi tokenizer, MAX_LENGTH/STRIDE, mode padding, file data, dan kode preprocessing."""
+    digest = hashlib.sha1()
+    # Tokenizer non-fast tidak punya sidik jari isi; nama model dipakai sebagai gantinya
+    digest.update((tokenizer_fingerprint(tokenizer) or MODEL_NAME).encode("utf-8"))
+    digest.update(file_fingerprint(data_file, __file__).encode("utf-8"))
+    digest.update(f"{preprocess_fn.__name__}:{MAX_LENGTH}:{STRIDE}:{PADDING}".encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+def load_features(dataset, preprocess_fn, data_file, num_proc=PREPROCESS_NUM_PROC, cache_dir=FEATURE_CACHE_DIR):
+    """
+    Feature hasil preprocess_fn untuk dataset yang dibaca dari data_file, dari cache di
+    disk jika ada; jika belum, ditokenisasi (num_proc proses) lalu disimpan ke cache.
+    :return: datasets.Dataset feature
+    """
+    from datasets import load_from_disk
+
+    name = os.path.splitext(os.path.basename(data_file))[0]
+    path = os.path.join(cache_dir, f"{name}-{preprocess_fn.__name__}-{features_fingerprint(data_file, preprocess_fn)}")
+    if os.path.isdir(path):
+        print(f"✅ Feature dimuat dari cache '{path}'")
+        return load_from_disk(path)
+
+    features = dataset.map(
+        preprocess_fn,
+        batched=True,
+        remove_columns=dataset.column_names,
+        num_proc=num_proc if num_proc > 1 else None
+    )
+    # Disimpan ke direktori sementara lalu di-rename, sehingga run yang terhenti di tengah
+    # tidak meninggalkan cache setengah jadi yang dimuat run berikutnya
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    features.save_to_disk(tmp_path)
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        # Proses lain sudah menyimpan cache yang sama lebih dulu
+        if not os.path.isdir(path):
+            raise
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    print(f"✅ Feature disimpan ke cache '{path}'")
+    return features
@@ -0,0 +1,30 @@
+import requests
+import yaml
+
+# Muat konfigurasi dari file YAML
+with open('cfg/config.yaml', 'r', encoding='utf-8') as file:
+    config = yaml.safe_load(file)
+
+# Alamat qa_service.py, misal "http://localhost:8000"; kosong -> model dijalankan di proses Streamlit
+QA_SERVICE_URL = (config["Config"].get("QA_SERVICE_URL") or "").rstrip("/")
+QA_SERVICE_TIMEOUT = config["Config"].get("QA_SERVICE_TIMEOUT", 30)
+
+# Satu session agar koneksi HTTP ke layanan dipakai ulang (keep-alive)
+_session = requests.Session()
+
+
+def _post(path, payload):
+    response = _session.post(f"{QA_SERVICE_URL}{path}", json=payload, timeout=QA_SERVICE_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+def remote_answer(question):
+    """Jawaban dari layanan QA: tuple (jawaban, skor), sama seperti generate_answer lokal."""
+    result = _post("/answer", {"question": question})
+    return result["answer"], result["score"]
+
+
+def remote_extract(question, context):
+    """Hasil reader dari layanan QA: dict {"answer", "score", "start", "end"}."""
+    return _post("/extract", {"question": question, "context": context})
@@ -0,0 +1,334 @@
+import time
+from contextlib import contextmanager
+
+import faiss
+import numpy as np
+import torch
+import yaml
+
+from utils.embedding import get_encoder, get_query_embeddings, reload_encoder
+from utils.reader import read_pairs, load_reader, tokenizer_fingerprint, READER_BACKEND, READER_PRETOKENIZED
+from utils.passages import load_passage_store
+from utils.retriever import PassageRetriever, FAISS_INDEX_PATH
+from utils.rerank import RERANKER, RERANK_CANDIDATES, READER_TOP_K, load_reranker, warmup_reranker
+from utils.telemetry import observe_stage, PASSAGES_READ
+
+# Muat konfigurasi dari file YAML
+with open('cfg/config.yaml', 'r', encoding='utf-8') as file:
+    config = yaml.safe_load(file)
+
+TRAIN_FILE = config["Config"]["DATASET_NAME"]
+TOP_K = config["Config"].get("TOP_K", 5)
+# Jumlah context yang dibaca per langkah pada answer_events (1 -> kandidat jawaban
+# pertama muncul secepat mungkin; lebih besar -> throughput batch lebih baik)
+STREAM_CHUNK_SIZE = config["Config"].get("STREAM_CHUNK_SIZE", 1)
+# Pembacaan adaptif: context dibaca urut kemiripan, ADAPTIVE_CHUNK_SIZE context per
+# langkah, dan berhenti lebih awal jika skor reader (0-1) sudah >= ADAPTIVE_SCORE_THRESHOLD,
+# atau jika jarak FAISS context berikutnya > jarak context teratas + ADAPTIVE_DISTANCE_GAP
+# (hanya saat urutan passage = urutan jarak FAISS, yaitu tanpa retrieval hybrid/re-ranker)
+ADAPTIVE_READING = config["Config"].get("ADAPTIVE_READING", False)
+ADAPTIVE_CHUNK_SIZE = config["Config"].get("ADAPTIVE_CHUNK_SIZE", 2)
+ADAPTIVE_SCORE_THRESHOLD = config["Config"].get("ADAPTIVE_SCORE_THRESHOLD", 0.5)
+ADAPTIVE_DISTANCE_GAP = config["Config"].get("ADAPTIVE_DISTANCE_GAP", None)
+
+
+@contextmanager
+def _stage(timings, name, items=None):
+    """
+    Mencatat lama blok kode ke histogram tahap (utils.telemetry), dan menambahkannya
+    (detik) ke timings[name] jika timings diberikan.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        observe_stage(name, seconds, items)
+        if timings is not None:
+            timings[name] = timings.get(name, 0.0) + seconds
+
+
+def set_worker_threads(threads):
+    """Membatasi thread PyTorch dan FAISS (OpenMP) di satu proses worker."""
+    torch.set_num_threads(threads)
+    faiss.omp_set_num_threads(threads)
+
+
+class QAEngine:
+    """
+    Alur tanya-jawab (retriever + re-ranker opsional + reader) tanpa ketergantungan Streamlit, dipakai
+    oleh aplikasi Streamlit, layanan HTTP (qa_service.py), dan skrip batch.
+    Semua method *_batch memproses banyak pertanyaan sekaligus: satu encode embedding,
+    satu pencarian FAISS, dan satu forward pass reader untuk seluruh pasangan
+    (pertanyaan, context). Argumen timings (dict, opsional) diisi lama setiap tahap
+    dalam detik: "embed", "search", "rerank", dan "read".
+    Tanpa re-ranker, reader membaca top_k passage hasil retriever. Dengan re-ranker,
+    retriever mengambil rerank_candidates passage, lalu hanya reader_top_k passage
+    dengan skor re-ranker tertinggi yang dibaca reader.
+    Dengan adaptive=True, answer_batch/answer_events berhenti membaca context setelah
+    kandidat jawaban cukup yakin (lihat ADAPTIVE_* pada config).
+    """
+
+    def __init__(self, retriever, qa_model, qa_tokenizer, top_k=TOP_K, reranker=RERANKER,
+                 rerank_candidates=RERANK_CANDIDATES, reader_top_k=READER_TOP_K, adaptive=ADAPTIVE_READING,
+                 adaptive_chunk_size=ADAPTIVE_CHUNK_SIZE, score_threshold=ADAPTIVE_SCORE_THRESHOLD,
+                 distance_gap=ADAPTIVE_DISTANCE_GAP):
+        self.retriever = retriever
+        self.qa_model = qa_model
+        self.qa_tokenizer = qa_tokenizer
+        self.top_k = top_k
+        self.reranker = load_reranker(reranker, retriever.sparse)
+        self.rerank_candidates = rerank_candidates
+        self.reader_top_k = reader_top_k
+        self.adaptive = adaptive
+        self.adaptive_chunk_size = adaptive_chunk_size
+        self.score_threshold = score_threshold
+        self.distance_gap = distance_gap
+
+    @classmethod
+    def load(cls, index_path=FAISS_INDEX_PATH, backend=READER_BACKEND, top_k=TOP_K, with_reader=True):
+        """
+        :param with_reader: False -> reader belum dimuat (qa_model/qa_tokenizer None);
+                            muat kemudian dengan load_reader()
+        """
+        retriever = PassageRetriever.load(index_path, load_passage_store(TRAIN_FILE))
+        get_encoder()
+        warmup_reranker()
+        engine = cls(retriever, None, None, top_k=top_k)
+        if with_reader:
+            engine.load_reader(backend)
+        return engine
+
+    def load_reader(self, backend=READER_BACKEND):
+        self.qa_model, self.qa_tokenizer = load_reader(backend)
+
+    def after_fork(self):
+        """
+        Dipanggil di proses anak setelah fork (qa_service.py, qa-system.py). Bobot
+        PyTorch dan index dibagi copy-on-write dengan proses induk, tetapi sesi ONNX
+        Runtime tidak aman di-fork sehingga dibuat ulang di sini.
+        """
+        if self.qa_model is None:
+            self.load_reader()
+        reload_encoder()
+
+    def retrieve_passages_batch(self, questions, timings=None, embeddings=None):
+        """
+        :param embeddings: embedding pertanyaan yang sudah dihitung (misalnya untuk semantic
+                           cache), shape (len(questions), emb_dim); jika ada, encode dilewati
+        :return: list passage dict dengan context unik untuk setiap pertanyaan, urut
+                 kemiripan retriever (atau skor re-ranker jika re-ranker aktif)
+        """
+        return [passages for _, passages in self.retrieve_scored_batch(questions, timings, embeddings)]
+
+    def retrieve_scored_batch(self, questions, timings=None, embeddings=None):
+        """
+        Seperti retrieve_passages_batch, beserta jarak FAISS setiap passage.
+        :return: list tuple (list jarak FAISS atau None, list passage dict) per pertanyaan;
+                 jarak None jika urutan passage bukan urutan jarak FAISS (retrieval
+                 hybrid atau re-ranker)
+        """
+        embed_seconds = 0.0
+
+        def encode(texts):
+            nonlocal embed_seconds
+            if embeddings is not None:
+                # Sudah di-encode (dan dicatat sebagai tahap "embed") oleh pemanggil
+                return embeddings
+            start = time.perf_counter()
+            with _stage(timings, "embed", len(texts)):
+                encoded = get_query_embeddings(texts)
+            embed_seconds += time.perf_counter() - start
+            return encoded
+
+        k = self.rerank_candidates if self.reranker is not None else self.top_k
+        start = time.perf_counter()
+        results = self.retriever.search_questions(questions, encode, k=k)
+        # Waktu pencarian (FAISS dan BM25) = total retriever dikurangi encode query
+        search_seconds = time.perf_counter() - start - embed_seconds
+        observe_stage("search", search_seconds, len(questions))
+        if timings is not None:
+            timings["search"] = timings.get("search", 0.0) + search_seconds
+        unique_passages, unique_distances = [], []
+        for scores, passages in results:
+            # Index per pertanyaan bisa mengembalikan paragraf yang sama berulang kali
+            by_context = {}
+            for score, passage in zip(scores, passages):
+                by_context.setdefault(passage["context"], (score, passage))
+            unique_distances.append([score for score, _ in by_context.values()])
+            unique_passages.append([passage for _, passage in by_context.values()])
+        if self.reranker is not None:
+            with _stage(timings, "rerank", sum(len(p) for p in unique_passages)):
+                unique_passages = self.rerank_batch(questions, unique_passages)
+        if self.reranker is not None or self.retriever.sparse is not None:
+            unique_distances = [None] * len(unique_passages)
+        return list(zip(unique_distances, unique_passages))
+
+    def rerank_batch(self, questions, passages_per_question):
+        """
+        Menilai semua pasangan (pertanyaan, passage) dengan re-ranker dalam satu panggilan,
+        lalu menyisakan reader_top_k passage terbaik per pertanyaan.
+        """
+        pair_questions, pair_contexts = [], []
+        for question, passages in zip(questions, passages_per_question):
+            pair_questions.extend([question] * len(passages))
+            pair_contexts.extend(p["context"] for p in passages)
+        scores = self.reranker.score_pairs(pair_questions, pair_contexts)
+
+        reranked, offset = [], 0
+        for passages in passages_per_question:
+            passage_scores = scores[offset:offset + len(passages)]
+            offset += len(passages)
+            # Urutan stabil: skor sama tetap mengikuti peringkat retriever
+            order = np.argsort(-passage_scores, kind="stable")[:self.reader_top_k]
+            reranked.append([passages[i] for i in order])
+        return reranked
+
+    @property
+    def pretokenized(self):
+        """True jika token context di passage store dibuat dengan tokenizer reader ini."""
+        fingerprint = self.retriever.store.tokenizer_fingerprint
+        return (
+            READER_PRETOKENIZED and fingerprint is not None and self.qa_tokenizer is not None
+            and fingerprint == tokenizer_fingerprint(self.qa_tokenizer)
+        )
+
+    def context_tokens(self, passages):
+        """Token context passage dari passage store, atau None (context ditokenisasi reader)."""
+        if not passages or not self.pretokenized:
+            return None
+        return self.retriever.store.context_tokens([passage["id"] for passage in passages])
+
+    def extract_batch(self, questions, contexts, timings=None, context_tokens=None):
+        """
+        Reader saja: satu jawaban dict {"answer", "score", "start", "end"} per pasangan.
+        :param context_tokens: token context dari context_tokens() (opsional)
+        """
+        with _stage(timings, "read", len(contexts)):
+            return read_pairs(self.qa_model, self.qa_tokenizer, questions, contexts, context_tokens=context_tokens)
+
+    def answer_batch(self, questions, timings=None, stats=None, embeddings=None):
+        """
+        :param embeddings: lihat retrieve_passages_batch
+        :param stats: list (opsional) yang diisi dict {"read", "total", "stop"} per pertanyaan:
+                      jumlah context yang dibaca reader, jumlah context hasil retriever, dan
+                      alasan berhenti ("score", "gap", atau "all")
+        :return: list tuple (jawaban, skor), satu per pertanyaan; jawaban dengan skor
+                 tertinggi di antara context hasil retriever (yang dibaca)
+        """
+        if self.adaptive:
+            return self._answer_batch_adaptive(questions, timings, stats, embeddings)
+
+        passages_per_question = self.retrieve_passages_batch(questions, timings, embeddings)
+        pair_questions, pair_passages = [], []
+        for question, passages in zip(questions, passages_per_question):
+            pair_questions.extend([question] * len(passages))
+            pair_passages.extend(passages)
+        results = self.extract_batch(
+            pair_questions, [p["context"] for p in pair_passages], timings, self.context_tokens(pair_passages)
+        )
+
+        answers, offset = [], 0
+        for passages in passages_per_question:
+            candidates = results[offset:offset + len(passages)]
+            offset += len(passages)
+            if not candidates:
+                answers.append(("", 0.0))
+                continue
+            best = max(candidates, key=lambda res: res["score"])
+            answers.append((best["answer"], best["score"]))
+        for passages in passages_per_question:
+            self._record_read(stats, len(passages), len(passages), "all")
+        return answers
+
+    def _stop_reason(self, best, distances, read, total):
+        """Alasan berhenti membaca context setelah read dari total context, atau None (lanjut)."""
+        if read >= total:
+            return "all"
+        if best is not None and best["score"] >= self.score_threshold:
+            return "score"
+        # Passage urut jarak naik, sehingga semua sisa passage juga melewati batas
+        if self.distance_gap is not None and distances is not None and distances[read] - distances[0] > self.distance_gap:
+            return "gap"
+        return None
+
+    @staticmethod
+    def _record_read(stats, read, total, stop):
+        PASSAGES_READ.observe(read, stop=stop)
+        if stats is not None:
+            stats.append({"read": read, "total": total, "stop": stop})
+
+    def _answer_batch_adaptive(self, questions, timings=None, stats=None, embeddings=None):
+        """
+        answer_batch dengan pembacaan adaptif: setiap langkah membaca adaptive_chunk_size
+        context berikutnya dari semua pertanyaan yang belum selesai dalam satu forward pass.
+        """
+        scored = self.retrieve_scored_batch(questions, timings, embeddings)
+        best = [None] * len(questions)
+        read = [0] * len(questions)
+        stops = [self._stop_reason(None, distances, 0, len(passages)) for distances, passages in scored]
+        active = [i for i, stop in enumerate(stops) if stop is None]
+        while active:
+            pair_questions, pair_passages, owners = [], [], []
+            for i in active:
+                chunk = scored[i][1][read[i]:read[i] + self.adaptive_chunk_size]
+                pair_questions.extend([questions[i]] * len(chunk))
+                pair_passages.extend(chunk)
+                owners.extend([i] * len(chunk))
+                read[i] += len(chunk)
+            results = self.extract_batch(
+                pair_questions, [p["context"] for p in pair_passages], timings, self.context_tokens(pair_passages)
+            )
+            for i, result in zip(owners, results):
+                if best[i] is None or result["score"] > best[i]["score"]:
+                    best[i] = result
+            for i in active:
+                stops[i] = self._stop_reason(best[i], scored[i][0], read[i], len(scored[i][1]))
+            active = [i for i in active if stops[i] is None]
+
+        for i, (_, passages) in enumerate(scored):
+            self._record_read(stats, read[i], len(passages), stops[i])
+        return [("", 0.0) if result is None else (result["answer"], result["score"]) for result in best]
+
+    def answer(self, question, embeddings=None):
+        return self.answer_batch([question], embeddings=embeddings)[0]
+
+    def answer_events(self, question, chunk_size=None, embeddings=None):
+        """
+        Versi bertahap dari answer() untuk ditampilkan sambil berjalan.
+        :return: generator dict event sesuai urutan:
+                 {"type": "passages", "passages"} segera setelah FAISS selesai,
+                 {"type": "candidate", "answer", "score", "passage_index", "read", "total"}
+                 setiap selesai membaca chunk_size context (kandidat terbaik sejauh ini),
+                 {"type": "final", "answer", "score"} di akhir. Dengan adaptive=True
+                 pembacaan bisa berhenti sebelum read == total
+        :param chunk_size: jumlah context per langkah; default adaptive_chunk_size jika
+                           adaptive=True (berhenti di titik yang sama dengan answer_batch),
+                           selain itu STREAM_CHUNK_SIZE
+        """
+        if chunk_size is None:
+            chunk_size = self.adaptive_chunk_size if self.adaptive else STREAM_CHUNK_SIZE
+        distances, passages = self.retrieve_scored_batch([question], embeddings=embeddings)[0]
+        yield {"type": "passages", "passages": passages}
+
+        best, read, stop = None, 0, "all"
+        for start in range(0, len(passages), chunk_size):
+            chunk = passages[start:start + chunk_size]
+            results = self.extract_batch(
+                [question] * len(chunk), [p["context"] for p in chunk], context_tokens=self.context_tokens(chunk)
+            )
+            for offset, result in enumerate(results):
+                if best is None or result["score"] > best["score"]:
+                    best = {"answer": result["answer"], "score": result["score"], "passage_index": start + offset}
+            read = start + len(chunk)
+            yield {"type": "candidate", **best, "read": read, "total": len(passages)}
+            if self.adaptive:
+                stop = self._stop_reason(best, distances, read, len(passages))
+                if stop is not None:
+                    break
+        self._record_read(None, read, len(passages), stop)
+
+        if best is None:
+            yield {"type": "final", "answer": "", "score": 0.0}
+        else:
+            yield {"type": "final", "answer": best["answer"], "score": best["score"]}
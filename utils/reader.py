@@ -0,0 +1,345 @@
+import os
+import hashlib
+from functools import lru_cache
+
+import numpy as np
+import torch
+import yaml
+
+# Muat konfigurasi dari file YAML
+with open('cfg/config.yaml', 'r', encoding='utf-8') as file:
+    config = yaml.safe_load(file)
+
+MAX_LENGTH = config["Config"]["MAX_LENGTH"]
+STRIDE = config["Config"]["STRIDE"]
+# Panjang jawaban maksimum saat inferensi, default sama dengan pipeline question-answering
+READER_MAX_ANS_LENGTH = config["Config"].get("READER_MAX_ANS_LENGTH", 15)
+# Jumlah fitur (jendela token) maksimum per forward pass reader; batch yang lebih besar
+# (misalnya QA_BATCH_SIZE x TOP_K di qa-system.py) dibaca dalam beberapa forward pass
+READER_MAX_BATCH_FEATURES = config["Config"].get("READER_MAX_BATCH_FEATURES", 64)
+FINETUNED_MODEL_NAME = config["Config"]["FINETUNED_MODEL_NAME"]
+
+# Backend inferensi reader: "pytorch", "onnx", atau "onnx-int8" (hasil export_onnx.py)
+READER_BACKEND = config["Config"].get("READER_BACKEND", "pytorch")
+READER_ONNX_DIR = config["Config"].get("READER_ONNX_DIR", f"{FINETUNED_MODEL_NAME}-onnx")
+ONNX_FILENAMES = {"onnx": "model.onnx", "onnx-int8": "model.int8.onnx"}
+# Pakai token passage yang disimpan faiss_index.py di passage store, sehingga saat query
+# hanya pertanyaan yang ditokenisasi (jika tokenizer store sama dengan tokenizer reader)
+READER_PRETOKENIZED = config["Config"].get("READER_PRETOKENIZED", True)
+
+
+class TorchQAModel:
+    """Model QA PyTorch (eager) dengan antarmuka numpy yang sama seperti OnnxQAModel."""
+
+    def __init__(self, model):
+        self.model = model.eval()
+
+    def __call__(self, inputs):
+        """
+        :param inputs: dict nama input -> np.ndarray [batch, seq_len]
+        :return: tuple (start_logits, end_logits) np.ndarray float32
+        """
+        with torch.no_grad():
+            outputs = self.model(**{
+                name: torch.as_tensor(value, device=self.model.device)
+                for name, value in inputs.items()
+            })
+        return outputs.start_logits.float().cpu().numpy(), outputs.end_logits.float().cpu().numpy()
+
+
+class OnnxQAModel:
+    """Model QA hasil export ONNX (fp32 atau int8) yang dijalankan dengan ONNX Runtime di CPU."""
+
+    def __init__(self, path):
+        # onnxruntime hanya dibutuhkan jika backend ONNX dipilih
+        import onnxruntime as ort
+
+        self.session = ort.InferenceSession(path, providers=["CPUExecutionProvider"])
+        self.input_names = [node.name for node in self.session.get_inputs()]
+
+    def __call__(self, inputs):
+        start_logits, end_logits = self.session.run(
+            ["start_logits", "end_logits"],
+            {name: inputs[name].astype(np.int64) for name in self.input_names}
+        )
+        return start_logits, end_logits
+
+
+def load_reader_tokenizer(backend=READER_BACKEND):
+    """Tokenizer reader sesuai backend (dipakai juga faiss_index.py untuk token passage)."""
+    # transformers diimpor saat reader dimuat agar import modul ini tetap ringan
+    from transformers import AutoTokenizer
+
+    if backend == "pytorch":
+        return AutoTokenizer.from_pretrained(FINETUNED_MODEL_NAME)
+    if backend in ONNX_FILENAMES:
+        return AutoTokenizer.from_pretrained(READER_ONNX_DIR)
+    raise ValueError(f"READER_BACKEND tidak dikenal: {backend}")
+
+
+def load_reader(backend=READER_BACKEND):
+    """
+    Memuat model reader sesuai backend pada config.
+    :return: tuple (model TorchQAModel/OnnxQAModel, tokenizer)
+    """
+    from transformers import AutoModelForQuestionAnswering
+
+    tokenizer = load_reader_tokenizer(backend)
+    if backend == "pytorch":
+        model = AutoModelForQuestionAnswering.from_pretrained(FINETUNED_MODEL_NAME)
+        return TorchQAModel(model), tokenizer
+    return OnnxQAModel(os.path.join(READER_ONNX_DIR, ONNX_FILENAMES[backend])), tokenizer
+
+
+@lru_cache(maxsize=8)
+def tokenizer_fingerprint(tokenizer):
+    """
+    Sidik jari isi tokenizer (vocab, normalizer, aturan pemisahan), sama untuk salinan
+    tokenizer di direktori lain. None untuk tokenizer non-fast (tidak didukung).
+    """
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is None:
+        return None
+    return hashlib.sha1(backend.to_str().encode("utf-8")).hexdigest()[:16]
+
+
+def tokenize_passages(tokenizer, contexts, batch_size=256):
+    """
+    Token seluruh context (tanpa token spesial dan tanpa truncation) untuk disimpan di
+    passage store.
+    :return: list tuple (token_ids int32 [n], offsets int32 [n, 2]), satu per context
+    """
+    results = []
+    for start in range(0, len(contexts), batch_size):
+        encodings = tokenizer(
+            list(contexts[start:start + batch_size]),
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            verbose=False,
+        )
+        for ids, offsets in zip(encodings["input_ids"], encodings["offset_mapping"]):
+            results.append((
+                np.asarray(ids, dtype=np.int32),
+                np.asarray(offsets, dtype=np.int32).reshape(-1, 2),
+            ))
+    return results
+
+
+@lru_cache(maxsize=8)
+def _pair_template(tokenizer):
+    """
+    Susunan token spesial pasangan (pertanyaan, context) milik tokenizer, misalnya
+    [CLS] q [SEP] c [SEP], beserta token_type_ids setiap bagian.
+    """
+    ids = tokenizer.build_inputs_with_special_tokens([-1], [-2])
+    types = tokenizer.create_token_type_ids_from_sequences([-1], [-2])
+    q, c = ids.index(-1), ids.index(-2)
+    return {
+        "prefix": (ids[:q], types[:q]),
+        "question_type": types[q],
+        "middle": (ids[q + 1:c], types[q + 1:c]),
+        "context_type": types[c],
+        "suffix": (ids[c + 1:], types[c + 1:]),
+        "num_special": len(ids) - 2,
+    }
+
+
+def _context_windows(num_tokens, window, stride):
+    """
+    Jendela (start, stop) token context seperti truncation "only_second" dengan stride
+    pada tokenizer fast: geser window - stride token hingga token terakhir tercakup.
+    """
+    windows, start = [], 0
+    while True:
+        stop = min(start + window, num_tokens)
+        windows.append((start, stop))
+        if stop >= num_tokens:
+            return windows
+        start += window - stride
+
+
+def _best_spans(start_logits, end_logits, context_mask, cls_mask, max_answer_len):
+    """
+    Mencari span terbaik untuk setiap fitur sekaligus (vektorisasi NumPy).
+    Skor dihitung seperti pipeline question-answering: softmax start * softmax end.
+    :return: tuple (start_idx, end_idx, score), masing-masing shape [num_features]
+    """
+    # Token di luar context (pertanyaan, padding) tidak ikut softmax; token CLS ikut
+    # dinormalisasi tetapi tidak boleh dipilih sebagai jawaban (sama dengan pipeline)
+    softmax_mask = context_mask | cls_mask
+    start_logits = np.where(softmax_mask, start_logits, -10000.0)
+    end_logits = np.where(softmax_mask, end_logits, -10000.0)
+
+    start_probs = np.exp(start_logits - start_logits.max(axis=-1, keepdims=True))
+    start_probs /= start_probs.sum(axis=-1, keepdims=True)
+    end_probs = np.exp(end_logits - end_logits.max(axis=-1, keepdims=True))
+    end_probs /= end_probs.sum(axis=-1, keepdims=True)
+    start_probs[cls_mask] = 0.0
+    end_probs[cls_mask] = 0.0
+
+    # Hanya pita end = start + offset, offset 0..max_answer_len-1 yang dinilai:
+    # skor [fitur, start, offset], O(fitur x seq x max_answer_len) alih-alih seq x seq
+    num_features, seq_len = start_probs.shape
+    band = np.zeros((num_features, seq_len, max_answer_len), dtype=start_probs.dtype)
+    for offset in range(min(max_answer_len, seq_len)):
+        band[:, :seq_len - offset, offset] = start_probs[:, :seq_len - offset] * end_probs[:, offset:]
+
+    # Urutan (start, offset) sama dengan (start, end), sehingga skor seri memilih span yang sama
+    flat = band.reshape(num_features, -1)
+    flat_best = flat.argmax(axis=-1)
+    start_idx, offsets = np.unravel_index(flat_best, (seq_len, max_answer_len))
+    scores = flat[np.arange(num_features), flat_best]
+    return start_idx, start_idx + offsets, scores
+
+
+def read_pairs(model, tokenizer, questions, contexts, max_length=MAX_LENGTH, stride=STRIDE,
+               max_answer_len=READER_MAX_ANS_LENGTH, context_tokens=None,
+               max_batch_features=READER_MAX_BATCH_FEATURES):
+    """
+    Membaca sekumpulan pasangan (pertanyaan, context) dalam batch ber-padding, paling
+    banyak max_batch_features fitur per forward pass model QA. Pasangan boleh berasal
+    dari pertanyaan yang berbeda.
+    :param model: TorchQAModel atau OnnxQAModel dari load_reader
+    :param tokenizer: tokenizer pasangan model
+    :param questions: list string pertanyaan
+    :param contexts: list string context (panjang sama dengan questions)
+    :param context_tokens: list tuple (token_ids, offsets) setiap context dari passage store
+                           (opsional); jika ada, context tidak ditokenisasi ulang
+    :return: list dict {"answer", "score", "start", "end"}, satu per pasangan
+    """
+    if len(contexts) == 0:
+        return []
+
+    encoded = None
+    if context_tokens is not None and all(tokens is not None for tokens in context_tokens):
+        encoded = _encode_pretokenized(tokenizer, questions, context_tokens, max_length, stride)
+    if encoded is None:
+        encoded = _encode_pairs(tokenizer, questions, contexts, max_length, stride)
+    model_inputs, sample_map, offsets, context_mask = encoded
+    cls_mask = model_inputs["input_ids"] == tokenizer.cls_token_id
+
+    start_idx, end_idx, scores = [], [], []
+    for start in range(0, len(sample_map), max_batch_features):
+        rows = slice(start, start + max_batch_features)
+        # Padding dipotong ke fitur terpanjang di chunk ini
+        seq_len = int(model_inputs["attention_mask"][rows].sum(axis=1).max()) if "attention_mask" in model_inputs \
+            else context_mask.shape[1]
+        chunk_inputs = {name: np.asarray(values)[rows, :seq_len] for name, values in model_inputs.items()}
+        start_logits, end_logits = model(chunk_inputs)
+        chunk_spans = _best_spans(
+            start_logits, end_logits, context_mask[rows, :seq_len], cls_mask[rows, :seq_len], max_answer_len
+        )
+        for collected, values in zip((start_idx, end_idx, scores), chunk_spans):
+            collected.append(values)
+    start_idx, end_idx, scores = (np.concatenate(values) for values in (start_idx, end_idx, scores))
+
+    # Ambil fitur dengan skor tertinggi untuk setiap pasangan
+    results = [None] * len(contexts)
+    for feature_idx, sample_idx in enumerate(sample_map):
+        score = float(scores[feature_idx])
+        if results[sample_idx] is not None and results[sample_idx]["score"] >= score:
+            continue
+        start_char = int(offsets[feature_idx][start_idx[feature_idx]][0])
+        end_char = int(offsets[feature_idx][end_idx[feature_idx]][1])
+        results[sample_idx] = {
+            "answer": contexts[sample_idx][start_char:end_char],
+            "score": score,
+            "start": start_char,
+            "end": end_char,
+        }
+    return results
+
+
+def _encode_pairs(tokenizer, questions, contexts, max_length, stride):
+    """Tokenisasi pasangan (pertanyaan, context) lengkap dengan tokenizer."""
+    encodings = tokenizer(
+        [question.strip() for question in questions],
+        list(contexts),
+        max_length=max_length,
+        truncation="only_second",
+        stride=stride,
+        return_overflowing_tokens=True,
+        return_offsets_mapping=True,
+        padding="longest",
+        return_tensors="np",
+    )
+    sample_map = encodings.pop("overflow_to_sample_mapping")
+    offsets = encodings.pop("offset_mapping")
+
+    # Posisi token context (sequence_id == 1) pada setiap fitur
+    context_mask = np.array([
+        [seq_id == 1 for seq_id in encodings.sequence_ids(i)]
+        for i in range(len(sample_map))
+    ])
+
+    model_inputs = {
+        name: encodings[name]
+        for name in tokenizer.model_input_names
+        if name in encodings
+    }
+    return model_inputs, sample_map, offsets, context_mask
+
+
+def _encode_pretokenized(tokenizer, questions, context_tokens, max_length, stride):
+    """
+    Menyusun fitur dari token context yang sudah disimpan: hanya pertanyaan yang
+    ditokenisasi, lalu disisipkan ke template token spesial bersama jendela context
+    (hasilnya sama dengan _encode_pairs). None jika tidak bisa (panjang pertanyaan
+    tidak menyisakan ruang context, atau padding kiri) sehingga dipakai _encode_pairs.
+    """
+    if tokenizer.padding_side != "right":
+        return None
+    template = _pair_template(tokenizer)
+    unique_questions = list(dict.fromkeys(question.strip() for question in questions))
+    question_ids = dict(zip(
+        unique_questions,
+        tokenizer(unique_questions, add_special_tokens=False)["input_ids"]
+    ))
+
+    features = []
+    for sample_idx, (question, (ids, offsets)) in enumerate(zip(questions, context_tokens)):
+        q_ids = question_ids[question.strip()]
+        window = max_length - len(q_ids) - template["num_special"]
+        if window <= stride:
+            return None
+        before = len(template["prefix"][0]) + len(q_ids) + len(template["middle"][0])
+        for start, stop in _context_windows(len(ids), window, stride):
+            features.append((sample_idx, q_ids, before, ids[start:stop], offsets[start:stop]))
+
+    seq_len = max(before + len(ids) + len(template["suffix"][0]) for _, _, before, ids, _ in features)
+    num_features = len(features)
+    input_ids = np.full((num_features, seq_len), tokenizer.pad_token_id, dtype=np.int64)
+    token_type_ids = np.zeros((num_features, seq_len), dtype=np.int64)
+    attention_mask = np.zeros((num_features, seq_len), dtype=np.int64)
+    offset_mapping = np.zeros((num_features, seq_len, 2), dtype=np.int64)
+    context_mask = np.zeros((num_features, seq_len), dtype=bool)
+    sample_map = np.empty(num_features, dtype=np.int64)
+
+    (prefix, prefix_types), (middle, middle_types), (suffix, suffix_types) = (
+        template["prefix"], template["middle"], template["suffix"]
+    )
+    for i, (sample_idx, q_ids, before, ids, offsets) in enumerate(features):
+        after = before + len(ids)
+        row = np.concatenate([prefix, q_ids, middle, ids, suffix]).astype(np.int64)
+        input_ids[i, :len(row)] = row
+        attention_mask[i, :len(row)] = 1
+        token_type_ids[i, :len(row)] = np.concatenate([
+            prefix_types, [template["question_type"]] * len(q_ids), middle_types,
+            [template["context_type"]] * len(ids), suffix_types
+        ])
+        offset_mapping[i, before:after] = offsets
+        context_mask[i, before:after] = True
+        sample_map[i] = sample_idx
+
+    arrays = {"input_ids": input_ids, "token_type_ids": token_type_ids, "attention_mask": attention_mask}
+    model_inputs = {name: arrays[name] for name in tokenizer.model_input_names if name in arrays}
+    return model_inputs, sample_map, offset_mapping, context_mask
+
+
+def read_contexts(model, tokenizer, question, contexts, **kwargs):
+    """
+    Membaca beberapa context untuk satu pertanyaan dalam satu batch ber-padding
+    dan satu forward pass model QA.
+    :return: list dict {"answer", "score", "start", "end"}, satu per context (urutan sama dengan contexts)
+    """
+    return read_pairs(model, tokenizer, [question] * len(contexts), contexts, **kwargs)
@@ -0,0 +1,92 @@
+import numpy as np
+import yaml
+
+from utils.lazy import LazyResource
+from utils.sparse import tokenize
+
+# Muat konfigurasi dari file YAML
+with open('cfg/config.yaml', 'r', encoding='utf-8') as file:
+    config = yaml.safe_load(file)
+
+# Re-ranker antara retriever dan reader: "none", "lexical" (overlap term berbobot IDF,
+# tanpa model), atau "cross-encoder" (model CrossEncoder sentence-transformers)
+RERANKER = config["Config"].get("RERANKER", "none")
+# Jumlah kandidat yang diambil retriever untuk di-rerank, dan yang diteruskan ke reader
+RERANK_CANDIDATES = config["Config"].get("RERANK_CANDIDATES", 20)
+READER_TOP_K = config["Config"].get("READER_TOP_K", 2)
+CROSS_ENCODER_MODEL_NAME = config["Config"].get(
+    "CROSS_ENCODER_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2"
+)
+RERANK_BATCH_SIZE = config["Config"].get("RERANK_BATCH_SIZE", 32)
+
+
+class LexicalReranker:
+    """
+    Skor = jumlah IDF term pertanyaan yang muncul di passage / jumlah IDF semua term
+    pertanyaan. IDF diambil dari index BM25; tanpa index BM25 semua term berbobot sama.
+    """
+
+    def __init__(self, sparse=None):
+        self.sparse = sparse
+
+    def _idf(self, term):
+        if self.sparse is None:
+            return 1.0
+        return self.sparse.idf(term)
+
+    def score_pairs(self, questions, contexts):
+        scores = []
+        for question, context in zip(questions, contexts):
+            weights = {term: self._idf(term) for term in set(tokenize(question))}
+            total = sum(weights.values())
+            if total <= 0:
+                scores.append(0.0)
+                continue
+            context_terms = set(tokenize(context))
+            scores.append(sum(w for term, w in weights.items() if term in context_terms) / total)
+        return np.array(scores, dtype=np.float32)
+
+
+def _load_cross_encoder():
+    # sentence_transformers diimpor saat model pertama kali dibutuhkan
+    from sentence_transformers import CrossEncoder
+
+    return CrossEncoder(CROSS_ENCODER_MODEL_NAME)
+
+
+# Model cross-encoder dimuat sekali per proses saat pertama kali dipakai
+cross_encoder_model = LazyResource("rerank.cross_encoder", _load_cross_encoder)
+
+
+class CrossEncoderReranker:
+    """Skor relevansi (pertanyaan, passage) dari model cross-encoder, semua pasangan satu batch."""
+
+    def score_pairs(self, questions, contexts):
+        if len(contexts) == 0:
+            return np.zeros(0, dtype=np.float32)
+        scores = cross_encoder_model.get().predict(
+            list(zip(questions, contexts)),
+            batch_size=RERANK_BATCH_SIZE,
+            show_progress_bar=False
+        )
+        return np.asarray(scores, dtype=np.float32)
+
+
+def load_reranker(kind=RERANKER, sparse=None):
+    """
+    :param sparse: BM25Index (opsional) untuk bobot IDF re-ranker "lexical"
+    :return: re-ranker dengan method score_pairs(questions, contexts), atau None untuk "none"
+    """
+    if kind in (None, "none"):
+        return None
+    if kind == "lexical":
+        return LexicalReranker(sparse)
+    if kind == "cross-encoder":
+        return CrossEncoderReranker()
+    raise ValueError(f"RERANKER tidak dikenal: {kind}")
+
+
+def warmup_reranker(kind=RERANKER):
+    """Memuat model re-ranker lebih awal (hanya cross-encoder yang punya model)."""
+    if kind == "cross-encoder":
+        cross_encoder_model.get()
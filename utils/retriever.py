@@ -0,0 +1,213 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+import faiss
+import numpy as np
+import yaml
+
+from utils.sparse import load_bm25_index
+from utils.telemetry import stage_timer
+
+
+# Muat konfigurasi dari file YAML
+with open('cfg/config.yaml', 'r', encoding='utf-8') as file:
+    config = yaml.safe_load(file)
+
+FAISS_INDEX_PATH = os.path.join("faiss_index", "my_index.faiss")
+# Manifest build index; ditulis faiss_index.py paling akhir, setelah index FAISS, passage
+# store, dan index BM25 selesai ditulis, sehingga menandai satu generasi index yang lengkap
+MANIFEST_PATH = os.path.join("faiss_index", "manifest.json")
+
+# Jenis index: "Flat" (exact), "IVFFlat", "IVFPQ", atau "HNSW"
+INDEX_TYPE = config["Config"].get("INDEX_TYPE", "Flat")
+IVF_NLIST = config["Config"].get("IVF_NLIST", 100)
+IVF_NPROBE = config["Config"].get("IVF_NPROBE", 8)
+PQ_M = config["Config"].get("PQ_M", 16)
+PQ_NBITS = config["Config"].get("PQ_NBITS", 8)
+HNSW_M = config["Config"].get("HNSW_M", 32)
+HNSW_EF_CONSTRUCTION = config["Config"].get("HNSW_EF_CONSTRUCTION", 200)
+HNSW_EF_SEARCH = config["Config"].get("HNSW_EF_SEARCH", 64)
+# Baca index secara memory-mapped (read-only) agar halaman index dipakai bersama
+# oleh semua proses di satu host lewat page cache, bukan disalin per proses.
+# Aman selama index ditulis dengan write_index (atomik), bukan ditimpa di tempat
+INDEX_MMAP = config["Config"].get("INDEX_MMAP", True)
+
+# Retrieval hybrid: hasil FAISS (dense) dan BM25 (sparse) digabung dengan
+# reciprocal-rank fusion, skor = sum 1 / (RRF_K + peringkat)
+HYBRID_RETRIEVAL = config["Config"].get("HYBRID_RETRIEVAL", True)
+# Jumlah kandidat dari masing-masing retriever sebelum digabung
+HYBRID_CANDIDATES = config["Config"].get("HYBRID_CANDIDATES", 20)
+RRF_K = config["Config"].get("RRF_K", 60)
+
+# Thread untuk pencarian BM25, berjalan bersamaan dengan encode query dan pencarian FAISS
+_sparse_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bm25")
+
+# Jumlah vektor latih minimum per centroid yang disarankan FAISS
+TRAIN_POINTS_PER_CENTROID = 39
+# Codebook PQ terkecil yang masih berguna (2**4 = 16 centroid per sub-vektor); korpus
+# dengan vektor lebih sedikit dari 2**MIN_PQ_NBITS tidak bisa dipakai untuk IVFPQ
+MIN_PQ_NBITS = 4
+
+
+def index_factory_string(index_type=INDEX_TYPE, nlist=IVF_NLIST, pq_nbits=PQ_NBITS):
+    """String faiss.index_factory untuk jenis index pada config."""
+    if index_type == "Flat":
+        return "Flat"
+    if index_type == "IVFFlat":
+        return f"IVF{nlist},Flat"
+    if index_type == "IVFPQ":
+        return f"IVF{nlist},PQ{PQ_M}x{pq_nbits}"
+    if index_type == "HNSW":
+        return f"HNSW{HNSW_M},Flat"
+    raise ValueError(f"INDEX_TYPE tidak dikenal: {index_type}")
+
+
+def create_index(dim, index_type=INDEX_TYPE, num_vectors=None):
+    """
+    Membuat FAISS index kosong (metric L2) dibungkus IDMap2.
+    :param num_vectors: perkiraan jumlah vektor; nlist IVF dan ukuran codebook PQ
+                        diperkecil jika korpus terlalu kecil
+    :return: tuple (index, jumlah vektor latih yang dibutuhkan sebelum add)
+    """
+    nlist = IVF_NLIST
+    pq_nbits = PQ_NBITS
+    if num_vectors is not None and index_type in ("IVFFlat", "IVFPQ"):
+        nlist = max(1, min(IVF_NLIST, num_vectors // TRAIN_POINTS_PER_CENTROID))
+    if num_vectors is not None and index_type == "IVFPQ":
+        # Training codebook PQ butuh minimal 2**nbits vektor
+        if num_vectors < 2 ** MIN_PQ_NBITS:
+            raise ValueError(f"IVFPQ butuh minimal {2 ** MIN_PQ_NBITS} passage, korpus hanya {num_vectors}")
+        pq_nbits = min(PQ_NBITS, int(num_vectors).bit_length() - 1)
+    inner = faiss.index_factory(dim, index_factory_string(index_type, nlist, pq_nbits), faiss.METRIC_L2)
+    if index_type == "HNSW":
+        inner.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+
+    train_size = 0
+    if not inner.is_trained:
+        train_size = nlist * TRAIN_POINTS_PER_CENTROID
+        if index_type == "IVFPQ":
+            train_size = max(train_size, (2 ** pq_nbits) * TRAIN_POINTS_PER_CENTROID)
+    return faiss.IndexIDMap2(inner), train_size
+
+
+def apply_search_params(index, nprobe=IVF_NPROBE, ef_search=HNSW_EF_SEARCH):
+    """Mengatur parameter pencarian (nprobe untuk IVF, efSearch untuk HNSW)."""
+    inner = faiss.downcast_index(index.index) if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) else index
+    ivf = faiss.try_extract_index_ivf(inner)
+    if ivf is not None:
+        ivf.nprobe = nprobe
+    if isinstance(inner, faiss.IndexHNSW):
+        inner.hnsw.efSearch = ef_search
+    return index
+
+
+def write_index(index, index_path):
+    """
+    Menyimpan FAISS index secara atomik (file sementara lalu rename). Proses yang sedang
+    me-mmap index lama (INDEX_MMAP) tetap membaca file lama sampai memuat ulang.
+    """
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    faiss.write_index(index, tmp_path)
+    os.replace(tmp_path, index_path)
+
+
+def read_index(index_path, mmap=INDEX_MMAP):
+    """
+    Membaca FAISS index; dengan mmap=True data vektor di-mmap dari file (read-only).
+    Jika versi FAISS atau jenis index tidak mendukung mmap, index dibaca biasa ke memori.
+    """
+    if mmap:
+        # IO_FLAG_MMAP_IFC (FAISS >= 1.10) juga me-mmap kode vektor index Flat
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        try:
+            return faiss.read_index(index_path, flags)
+        except RuntimeError:
+            pass
+    return faiss.read_index(index_path)
+
+
+def reciprocal_rank_fusion(rankings, k, rrf_k=RRF_K):
+    """
+    Menggabungkan beberapa daftar peringkat (list id, urut dari yang terbaik).
+    :return: tuple (list skor RRF, list id), k teratas urut dari skor tertinggi
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (rrf_k + rank + 1)
+    best = sorted(fused.items(), key=lambda pair: pair[1], reverse=True)[:k]
+    return [score for _, score in best], [item for item, _ in best]
+
+
+def supports_remove(index):
+    """HNSW tidak mendukung penghapusan vektor, sehingga perlu build penuh."""
+    inner = faiss.downcast_index(index.index) if isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2)) else index
+    return not isinstance(inner, faiss.IndexHNSW)
+
+
+class PassageRetriever:
+    """
+    Membungkus FAISS index beserta PassageStore-nya, dan (opsional) index BM25.
+    Index ber-IDMap menyimpan id hasil passage_faiss_id; index lama tanpa IDMap
+    memakai nomor baris.
+    """
+
+    def __init__(self, index, store, sparse=None):
+        self.index = index
+        self.store = store
+        self.sparse = sparse
+        self.id_mapped = isinstance(index, (faiss.IndexIDMap, faiss.IndexIDMap2))
+
+    @classmethod
+    def load(cls, index_path, store, mmap=INDEX_MMAP, hybrid=HYBRID_RETRIEVAL):
+        sparse = load_bm25_index() if hybrid else None
+        return cls(apply_search_params(read_index(index_path, mmap=mmap)), store, sparse=sparse)
+
+    def _dense_rows(self, query_embs, k):
+        """Pencarian FAISS; mengembalikan list (jarak, nomor baris store) per pertanyaan."""
+        query_embs = np.ascontiguousarray(query_embs, dtype=np.float32)
+        with stage_timer("faiss", items=len(query_embs)):
+            distances, ids = self.index.search(query_embs, k)
+        results = []
+        for query_distances, query_ids in zip(distances, ids):
+            rows = self.store.rows_for_faiss_ids(query_ids) if self.id_mapped else query_ids
+            keep = (query_ids >= 0) & (rows >= 0)
+            results.append((query_distances[keep].tolist(), rows[keep].tolist()))
+        return results
+
+    def search_batch(self, query_embs, k):
+        """
+        Mencari k passage terdekat untuk beberapa pertanyaan dalam satu panggilan FAISS.
+        :param query_embs: array shape (num_queries, emb_dim)
+        :return: list tuple (list skor jarak, list passage dict), satu per pertanyaan
+        """
+        return [
+            (scores, [self.store[row] for row in rows])
+            for scores, rows in self._dense_rows(query_embs, k)
+        ]
+
+    def search_questions(self, questions, encode, k):
+        """
+        Retrieval untuk teks pertanyaan. Tanpa index BM25 sama dengan search_batch
+        (skor = jarak FAISS). Dengan index BM25, pencarian BM25 berjalan di thread
+        terpisah selama encode(questions) dan pencarian FAISS, lalu kedua peringkat
+        digabung dengan reciprocal-rank fusion (skor = skor RRF, makin besar makin relevan).
+        :param encode: fungsi list pertanyaan -> array embedding (num_queries, emb_dim)
+        :return: list tuple (list skor, list passage dict), satu per pertanyaan
+        """
+        if self.sparse is None:
+            return self.search_batch(encode(questions), k)
+
+        candidates = max(k, HYBRID_CANDIDATES)
+        sparse_future = _sparse_executor.submit(self.sparse.search_batch, questions, candidates)
+        dense = self._dense_rows(encode(questions), candidates)
+        sparse = sparse_future.result()
+
+        results = []
+        for (_, dense_rows), (_, sparse_ids) in zip(dense, sparse):
+            sparse_rows = self.store.rows_for_faiss_ids(sparse_ids)
+            scores, rows = reciprocal_rank_fusion(
+                [dense_rows, sparse_rows[sparse_rows >= 0].tolist()], k
+            )
+            results.append((scores, [self.store[row] for row in rows]))
+        return results
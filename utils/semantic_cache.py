@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import OrderedDict
+
+import faiss
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """
+    Cache jawaban berdasarkan kemiripan embedding pertanyaan: pertanyaan yang
+    embedding-nya memiliki cosine similarity >= threshold dengan pertanyaan yang sudah
+    dijawab memakai jawaban tersimpan ("apa gejala DBD" ~ "gejala demam berdarah apa saja").
+    Embedding disimpan di index FAISS kecil (inner product atas vektor ternormalisasi),
+    dibatasi max_entries (LRU) dan umur entri (ttl, detik). Semua entri dihapus jika
+    versi (index/model) berubah. Thread-safe; statistik sama dengan LRUCache.
+    """
+
+    # Jumlah tetangga terdekat yang diperiksa per pencarian; entri kedaluwarsa dilewati
+    SEARCH_K = 8
+
+    def __init__(self, max_entries, threshold, ttl=None):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self._index = None
+        self._version = None
+        self._next_id = 0
+        # id vektor -> (jawaban, waktu kedaluwarsa), urutan LRU
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _normalize(embedding):
+        embedding = np.array(embedding, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(embedding)
+        return embedding
+
+    def _check_version(self, version):
+        # Index/model dibangun ulang -> jawaban lama tidak berlaku lagi
+        if version != self._version:
+            self._clear()
+            self._version = version
+
+    def _remove(self, ids):
+        self._index.remove_ids(np.asarray(ids, dtype=np.int64))
+        for vector_id in ids:
+            del self._data[vector_id]
+
+    def get(self, embedding, version=None, default=None):
+        """
+        :param embedding: embedding pertanyaan, shape (dim,) atau (1, dim)
+        :return: jawaban entri termirip yang belum kedaluwarsa dengan similarity >= threshold,
+                 selain itu default
+        """
+        query = self._normalize(embedding)
+        with self._lock:
+            self._check_version(version)
+            now = time.monotonic()
+            while self._index is not None and self._index.ntotal > 0:
+                k = min(self.SEARCH_K, self._index.ntotal)
+                similarities, ids = self._index.search(query, k)
+                expired = []
+                for similarity, vector_id in zip(similarities[0], ids[0].tolist()):
+                    if vector_id < 0 or similarity < self.threshold:
+                        break
+                    value, expires_at = self._data[vector_id]
+                    if expires_at is not None and now >= expires_at:
+                        expired.append(vector_id)
+                        continue
+                    if expired:
+                        self._remove(expired)
+                        self.expirations += len(expired)
+                    self._data.move_to_end(vector_id)
+                    self.hits += 1
+                    return value
+                if expired:
+                    self._remove(expired)
+                    self.expirations += len(expired)
+                # Semua k kandidat kedaluwarsa: cari lagi di antara entri yang tersisa
+                if len(expired) < k:
+                    break
+            self.misses += 1
+            return default
+
+    def put(self, embedding, value, version=None):
+        if self.max_entries <= 0:
+            return
+        embedding = self._normalize(embedding)
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._check_version(version)
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(embedding.shape[1]))
+            vector_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(embedding, np.array([vector_id], dtype=np.int64))
+            self._data[vector_id] = (value, expires_at)
+            if len(self._data) > self.max_entries:
+                evicted = list(self._data)[:len(self._data) - self.max_entries]
+                self._remove(evicted)
+                self.evictions += len(evicted)
+
+    def _clear(self):
+        if self._index is not None:
+            self._index.reset()
+        self._data.clear()
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """Statistik cache: hits, misses, hit_rate, evictions, expirations, entries, bytes (vektor index)."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._data),
+                "bytes": self._index.ntotal * self._index.d * 4 if self._index is not None else 0,
+            }
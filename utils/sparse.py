@@ -0,0 +1,138 @@
+import os
+import re
+import unicodedata
+from collections import Counter
+
+import numpy as np
+import yaml
+
+from utils.passages import passage_faiss_id
+from utils.telemetry import stage_timer
+
+# Muat konfigurasi dari file YAML
+with open('cfg/config.yaml', 'r', encoding='utf-8') as file:
+    config = yaml.safe_load(file)
+
+# Index BM25 disimpan di samping FAISS index dan dibangun ulang oleh faiss_index.py
+BM25_INDEX_PATH = os.path.join("faiss_index", "bm25.npz")
+BM25_K1 = config["Config"].get("BM25_K1", 1.2)
+BM25_B = config["Config"].get("BM25_B", 0.75)
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Token BM25: NFKC, huruf kecil, dipisah per kata (tanpa stemming)."""
+    return _TOKEN_RE.findall(unicodedata.normalize("NFKC", text).lower())
+
+
+class BM25Index:
+    """
+    Inverted index BM25 dalam format CSR NumPy: posting setiap term berada di
+    doc_rows[offsets[t]:offsets[t + 1]]. Bobot BM25 per posting (idf dan normalisasi
+    panjang dengan k1/b) sudah dihitung saat build, sehingga skor query cukup
+    dijumlahkan dengan np.bincount. Dokumen diidentifikasi dengan id FAISS passage.
+    """
+
+    def __init__(self, terms, offsets, doc_rows, weights, faiss_ids, k1=BM25_K1, b=BM25_B):
+        self.terms = terms
+        self.offsets = offsets
+        self.doc_rows = doc_rows
+        self.weights = weights
+        self.faiss_ids = faiss_ids
+        self.k1 = k1
+        self.b = b
+        self.vocab = {term: i for i, term in enumerate(terms.tolist())}
+
+    @classmethod
+    def build(cls, passages, k1=BM25_K1, b=BM25_B):
+        """:param passages: list passage dict (id, context), urutan sama dengan passage store"""
+        vocab = {}
+        term_ids, doc_rows, tfs, doc_lengths = [], [], [], []
+        for row, passage in enumerate(passages):
+            tokens = tokenize(passage["context"])
+            doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_rows.append(row)
+                tfs.append(tf)
+
+        term_ids = np.array(term_ids, dtype=np.int64)
+        doc_rows = np.array(doc_rows, dtype=np.int32)
+        tfs = np.array(tfs, dtype=np.float32)
+        doc_lengths = np.array(doc_lengths, dtype=np.float32)
+
+        # Posting diurutkan per term (CSR)
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, doc_rows, tfs = term_ids[order], doc_rows[order], tfs[order]
+        doc_freq = np.bincount(term_ids, minlength=len(vocab))
+        offsets = np.concatenate([[0], np.cumsum(doc_freq)]).astype(np.int64)
+
+        num_docs = max(len(passages), 1)
+        avg_length = max(float(doc_lengths.mean()) if len(doc_lengths) else 0.0, 1.0)
+        idf = np.log(1 + (num_docs - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        norm = k1 * (1 - b + b * doc_lengths[doc_rows] / avg_length)
+        weights = idf[term_ids] * tfs * (k1 + 1) / (tfs + norm)
+
+        terms = np.array(sorted(vocab, key=vocab.get))
+        faiss_ids = np.array([passage_faiss_id(p["id"]) for p in passages], dtype=np.int64)
+        return cls(terms, offsets, doc_rows, weights.astype(np.float32), faiss_ids, k1=k1, b=b)
+
+    @classmethod
+    def load(cls, path=BM25_INDEX_PATH):
+        data = np.load(path)
+        return cls(
+            data["terms"], data["offsets"], data["doc_rows"], data["weights"], data["faiss_ids"],
+            k1=float(data["k1"]), b=float(data["b"])
+        )
+
+    def save(self, path=BM25_INDEX_PATH):
+        """Menyimpan index secara atomik (file sementara lalu rename)."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        # Lewat file object agar np.savez tidak menambahkan akhiran .npz ke nama file sementara
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f, terms=self.terms, offsets=self.offsets, doc_rows=self.doc_rows,
+                weights=self.weights, faiss_ids=self.faiss_ids, k1=self.k1, b=self.b
+            )
+        os.replace(tmp_path, path)
+
+    def __len__(self):
+        return len(self.faiss_ids)
+
+    def idf(self, term):
+        """IDF BM25 sebuah term (0 untuk term di luar kosakata)."""
+        term_id = self.vocab.get(term)
+        if term_id is None:
+            return 0.0
+        doc_freq = self.offsets[term_id + 1] - self.offsets[term_id]
+        return float(np.log(1 + (len(self) - doc_freq + 0.5) / (doc_freq + 0.5)))
+
+    def search(self, question, k):
+        """
+        :return: tuple (skor BM25 float32, id FAISS int64), urut dari skor tertinggi;
+                 hanya dokumen yang memuat minimal satu term pertanyaan
+        """
+        term_ids = [self.vocab[t] for t in set(tokenize(question)) if t in self.vocab]
+        if not term_ids or len(self) == 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        postings = np.concatenate([np.arange(self.offsets[t], self.offsets[t + 1]) for t in term_ids])
+        scores = np.bincount(self.doc_rows[postings], weights=self.weights[postings], minlength=len(self))
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > k:
+            candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return scores[candidates].astype(np.float32), self.faiss_ids[candidates]
+
+    def search_batch(self, questions, k):
+        with stage_timer("bm25", items=len(questions)):
+            return [self.search(question, k) for question in questions]
+
+
+def load_bm25_index(path=BM25_INDEX_PATH):
+    """BM25Index dari file, atau None jika belum dibangun (index lama)."""
+    if not os.path.exists(path):
+        return None
+    return BM25Index.load(path)
@@ -0,0 +1,246 @@
+import os
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+import yaml
+
+from utils.lazy import startup_timings
+
+# Muat konfigurasi dari file YAML
+with open('cfg/config.yaml', 'r', encoding='utf-8') as file:
+    config = yaml.safe_load(file)
+
+# File teks format Prometheus (misalnya untuk textfile collector node_exporter);
+# kosong -> tidak ditulis. "{pid}" di path diganti pid proses (satu file per worker).
+# Ditulis paling sering sekali per METRICS_FILE_INTERVAL detik
+METRICS_FILE = config["Config"].get("METRICS_FILE", "")
+METRICS_FILE_INTERVAL = config["Config"].get("METRICS_FILE_INTERVAL", 15)
+
+# Batas bucket histogram latensi (detik): 0,1 ms (lookup cache, FAISS) sampai 10 s (reader)
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        for value in labels.values()
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+class Counter:
+    """Counter Prometheus dengan label; thread-safe."""
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def values(self):
+        with self._lock:
+            return {key: value for key, value in self._values.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values().items()):
+            lines.append(f"{self.name}{_format_labels(dict(zip(self.label_names, key)))} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    Histogram Prometheus dengan label (bucket kumulatif, _sum, _count); thread-safe.
+    quantile() memperkirakan persentil dari bucket seperti histogram_quantile().
+    """
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels[name] for name in self.label_names)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # Bucket terakhir = +Inf
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def series(self):
+        """:return: dict label tuple -> {"counts", "sum", "count"} (salinan)"""
+        with self._lock:
+            return {
+                key: {"counts": list(s["counts"]), "sum": s["sum"], "count": s["count"]}
+                for key, s in self._series.items()
+            }
+
+    def quantile(self, q, series):
+        """Perkiraan persentil q (0-1) dari satu seri, interpolasi linear di dalam bucket."""
+        if series["count"] == 0:
+            return 0.0
+        rank = q * series["count"]
+        cumulative = 0
+        for i, count in enumerate(series["counts"]):
+            if cumulative + count >= rank and count > 0:
+                if i == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.buckets[-1]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self.series().items()):
+            labels = dict(zip(self.label_names, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series["counts"]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {series['sum']}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {series['count']}")
+        return lines
+
+
+# Metrik bersama satu proses (satu per worker qa_service.py, satu per proses Streamlit)
+STAGE_SECONDS = Histogram(
+    "dokter_cilik_stage_seconds",
+    "Lama setiap tahap pipeline QA per panggilan (embed, search, rerank, read, cache lookup).",
+    ["stage"]
+)
+REQUEST_SECONDS = Histogram(
+    "dokter_cilik_request_seconds", "Lama satu permintaan tanya-jawab dari awal sampai jawaban.", ["path"]
+)
+REQUESTS = Counter("dokter_cilik_requests_total", "Jumlah permintaan tanya-jawab.", ["path", "source"])
+PASSAGES_READ = Histogram(
+    "dokter_cilik_passages_read",
+    "Jumlah context yang dibaca reader per pertanyaan, menurut alasan berhenti (score, gap, all).",
+    ["stop"], buckets=(1, 2, 3, 4, 5, 8, 10, 15, 20, 30, 50)
+)
+ITEMS = Counter("dokter_cilik_stage_items_total", "Jumlah item (pertanyaan/pasangan) yang diproses per tahap.", ["stage"])
+
+# Cache LRU yang statistiknya ikut diekspor: nama -> LRUCache
+_caches = {}
+
+
+def register_cache(name, cache):
+    """Mendaftarkan LRUCache agar hits/misses/evictions-nya ikut diekspor."""
+    _caches[name] = cache
+
+
+def cache_stats():
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+@contextmanager
+def stage_timer(stage, items=None):
+    """Mencatat lama blok kode ke histogram tahap (dan jumlah item, jika diberikan)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+        if items is not None:
+            ITEMS.inc(items, stage=stage)
+
+
+def observe_stage(stage, seconds, items=None):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    if items is not None:
+        ITEMS.inc(items, stage=stage)
+
+
+@contextmanager
+def track_request(path, source="model"):
+    """
+    Mencatat satu permintaan. source bisa diubah di dalam blok lewat dict yang
+    di-yield, misalnya info["source"] = "cache" jika jawaban diambil dari cache.
+    """
+    info = {"source": source}
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, path=path)
+        REQUESTS.inc(path=path, source=info["source"])
+        maybe_write_metrics_file()
+
+
+def render_metrics():
+    """Semua metrik proses ini dalam format teks Prometheus (exposition format 0.0.4)."""
+    lines = []
+    for metric in (STAGE_SECONDS, REQUEST_SECONDS, PASSAGES_READ, REQUESTS, ITEMS):
+        lines.extend(metric.render())
+
+    caches = cache_stats()
+    for field, kind in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"),
+                        ("expirations", "counter"), ("entries", "gauge"), ("bytes", "gauge")):
+        name = f"dokter_cilik_cache_{field}" + ("_total" if kind == "counter" else "")
+        lines.append(f"# TYPE {name} {kind}")
+        for cache_name, stats in sorted(caches.items()):
+            lines.append(f"{name}{_format_labels({'cache': cache_name})} {stats[field]}")
+
+    lines.append("# TYPE dokter_cilik_startup_seconds gauge")
+    for name, seconds in startup_timings().items():
+        lines.append(f"dokter_cilik_startup_seconds{_format_labels({'name': name})} {seconds}")
+    return "\n".join(lines) + "\n"
+
+
+_last_write = 0.0
+_write_lock = threading.Lock()
+
+
+def maybe_write_metrics_file(path=METRICS_FILE, interval=METRICS_FILE_INTERVAL, force=False):
+    """Menulis metrik ke METRICS_FILE (atomik: file sementara lalu rename), dibatasi interval."""
+    global _last_write
+    if not path:
+        return
+    now = time.monotonic()
+    if not force and now - _last_write < interval:
+        return
+    with _write_lock:
+        if not force and now - _last_write < interval:
+            return
+        _last_write = now
+        path = path.format(pid=os.getpid())
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(render_metrics())
+        os.replace(tmp_path, path)
+
+
+def stage_summary():
+    """
+    Ringkasan untuk panel debug: dict tahap -> {"count", "mean_ms", "p50_ms", "p95_ms", "p99_ms"}
+    (persentil perkiraan dari bucket histogram).
+    """
+    summary = {}
+    for histogram, prefix in ((STAGE_SECONDS, ""), (REQUEST_SECONDS, "request:")):
+        for key, series in sorted(histogram.series().items()):
+            summary[prefix + key[0]] = {
+                "count": series["count"],
+                "mean_ms": series["sum"] / series["count"] * 1000 if series["count"] else 0.0,
+                "p50_ms": histogram.quantile(0.50, series) * 1000,
+                "p95_ms": histogram.quantile(0.95, series) * 1000,
+                "p99_ms": histogram.quantile(0.99, series) * 1000,
+            }
+    return summary